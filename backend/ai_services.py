@@ -1,26 +1,31 @@
-import os
 import base64
-from typing import List, Dict
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from typing import AsyncIterator, List, Dict
+from emergentintegrations.llm.chat import UserMessage
 from models import TacticalInsight, ScreenshotAnalysisResult
+from grading import grade_subjects
+from llm_pool import LlmPool
+from prompt_builder import build_insights_prompt
 import json
 
-# Get Emergent LLM key from environment
-EMERGENT_LLM_KEY = os.getenv('EMERGENT_LLM_KEY')
+# One bounded pool per feature; each call still gets its own session
+screenshot_pool = LlmPool(
+    "screenshot_analysis",
+    system_message="You are an expert academic advisor analyzing student mark screenshots."
+)
+insights_pool = LlmPool(
+    "tactical_insights",
+    system_message="You are a tactical academic advisor providing actionable insights for students."
+)
+mentor_pool = LlmPool(
+    "coding_mentor",
+    system_message="You are an experienced coding mentor providing constructive feedback."
+)
 
-async def analyze_screenshot(image_base64: str) -> ScreenshotAnalysisResult:
+async def request_screenshot_analysis(image_base64: str) -> ScreenshotAnalysisResult:
     """
-    Analyze academic marks screenshot using OpenAI Vision
+    Analyze academic marks screenshot using OpenAI Vision, raising on provider errors
     """
-    try:
-        # Initialize chat with GPT-4 Vision
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id="screenshot_analysis",
-            system_message="You are an expert academic advisor analyzing student mark screenshots."
-        ).with_model("openai", "gpt-4o")
-        
-        prompt = """Analyze this academic marks screenshot and extract:
+    prompt = """Analyze this academic marks screenshot and extract:
 1. Subject names and codes
 2. Assessment components (quizzes, assignments, exams)
 3. Scores obtained and total marks
@@ -47,35 +52,42 @@ Return a JSON response in this exact format:
     "Quiz 2 is critical for maintaining trajectory"
   ]
 }"""
-        
-        user_message = UserMessage(
-            text=prompt,
-            images=[image_base64]
-        )
-        
-        response = await chat.send_message(user_message)
-        
-        # Parse JSON response
-        try:
-            # Extract JSON from response
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            if json_start != -1 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                result = json.loads(json_str)
-                return ScreenshotAnalysisResult(**result)
-            else:
-                # Fallback response if JSON parsing fails
-                return ScreenshotAnalysisResult(
-                    subjects=[],
-                    tactical_moves=["Unable to parse screenshot. Please ensure the image is clear and contains visible marks."]
-                )
-        except json.JSONDecodeError:
+    
+    user_message = UserMessage(
+        text=prompt,
+        images=[image_base64]
+    )
+    
+    response = await screenshot_pool.send(user_message)
+    
+    # Parse JSON response
+    try:
+        # Extract JSON from response
+        json_start = response.find('{')
+        json_end = response.rfind('}') + 1
+        if json_start != -1 and json_end > json_start:
+            json_str = response[json_start:json_end]
+            result = json.loads(json_str)
+            return ScreenshotAnalysisResult(**result)
+        else:
+            # Fallback response if JSON parsing fails
             return ScreenshotAnalysisResult(
                 subjects=[],
-                tactical_moves=["Unable to parse screenshot data. Please try again with a clearer image."]
+                tactical_moves=["Unable to parse screenshot. Please ensure the image is clear and contains visible marks."]
             )
-    
+    except json.JSONDecodeError:
+        return ScreenshotAnalysisResult(
+            subjects=[],
+            tactical_moves=["Unable to parse screenshot data. Please try again with a clearer image."]
+        )
+
+
+async def analyze_screenshot(image_base64: str) -> ScreenshotAnalysisResult:
+    """
+    Analyze academic marks screenshot using OpenAI Vision
+    """
+    try:
+        return await request_screenshot_analysis(image_base64)
     except Exception as e:
         print(f"Screenshot analysis error: {str(e)}")
         return ScreenshotAnalysisResult(
@@ -89,41 +101,21 @@ async def generate_tactical_insights(subjects: List[Dict], tasks: List[Dict]) ->
     Generate AI-powered tactical insights using GPT-4
     """
     try:
-        # Initialize chat with GPT-4
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id="tactical_insights",
-            system_message="You are a tactical academic advisor providing actionable insights for students."
-        ).with_model("openai", "gpt-4o")
-        
-        # Prepare context
+        # Prepare context, grading every subject in one bulk call
+        grades, statuses = grade_subjects([subject.get("components", []) for subject in subjects])
         subjects_summary = []
-        for subject in subjects:
+        for subject, grade, status in zip(subjects, grades, statuses):
             subjects_summary.append({
                 "name": subject.get("name"),
-                "compliance": subject.get("compliance"),
+                "compliance": round(float(grade), 2),
+                "status": status.value,
                 "pending_components": [c for c in subject.get("components", []) if c.get("pending")]
             })
         
-        prompt = f"""Based on this student's academic data, provide 3 tactical insights:
-
-Subjects: {json.dumps(subjects_summary, indent=2)}
-Tasks: {json.dumps(tasks, indent=2)}
-
-For each insight, identify:
-1. Type: 'tactical-move', 'compliance-alert', or 'achievement'
-2. Subject name
-3. Actionable message (concise, specific)
-4. Priority: 'high', 'medium', or 'low'
-
-Return JSON array format:
-[
-  {{"type": "tactical-move", "subject": "Subject Name", "message": "Focus on X to achieve Y", "priority": "high"}},
-  ...
-]"""
+        prompt, _ = build_insights_prompt(subjects_summary, tasks)
         
         user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+        response = await insights_pool.send(user_message)
         
         # Parse JSON response
         try:
@@ -143,21 +135,14 @@ Return JSON array format:
         return []
 
 
-async def generate_coding_mentor_feedback(code: str, test_results: List[Dict]) -> str:
-    """
-    Generate AI mentor feedback for coding submissions
-    """
-    try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id="coding_mentor",
-            system_message="You are an experienced coding mentor providing constructive feedback."
-        ).with_model("openai", "gpt-4o")
-        
-        passed = sum(1 for r in test_results if r.get('passed'))
-        total = len(test_results)
-        
-        prompt = f"""Review this code submission:
+MENTOR_FALLBACK = "Great effort! Keep practicing and reviewing test cases."
+
+
+def _mentor_prompt(code: str, test_results: List[Dict]) -> str:
+    passed = sum(1 for r in test_results if r.get('passed'))
+    total = len(test_results)
+    
+    return f"""Review this code submission:
 
 Code:
 ```
@@ -172,12 +157,27 @@ Provide brief mentor feedback (2-3 sentences) focusing on:
 3. Best practices
 
 Keep it encouraging and actionable."""
-        
-        user_message = UserMessage(text=prompt)
-        response = await chat.send_message(user_message)
+
+
+async def stream_coding_mentor_feedback(code: str, test_results: List[Dict]) -> AsyncIterator[str]:
+    """
+    Stream AI mentor feedback chunk by chunk, raising on provider errors
+    """
+    user_message = UserMessage(text=_mentor_prompt(code, test_results))
+    async for chunk in mentor_pool.stream(user_message):
+        yield chunk
+
+
+async def generate_coding_mentor_feedback(code: str, test_results: List[Dict]) -> str:
+    """
+    Generate AI mentor feedback for coding submissions
+    """
+    try:
+        user_message = UserMessage(text=_mentor_prompt(code, test_results))
+        response = await mentor_pool.send(user_message)
         
         return response
     
     except Exception as e:
         print(f"Mentor feedback error: {str(e)}")
-        return "Great effort! Keep practicing and reviewing test cases."
+        return MENTOR_FALLBACK
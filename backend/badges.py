@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Badge award engine
+
+Badge.criteria maps metric names to thresholds, e.g.
+{"challenges_completed": 10} or {"min_compliance": 90}; a badge is earned
+once every metric in its criteria reaches its threshold. Rules are indexed
+by metric, so a write that changes one metric for one user only computes
+the metrics of the badges that depend on it, for that user, and only for
+badges the user has not earned yet.
+
+Every metric is computed for a batch of users with one aggregation, which
+the backfill uses to award badges across the whole user base in batches.
+
+Usage:
+    python badges.py --backfill [--batch-size 500]
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import UpdateOne
+
+from database import badges_collection, subjects_collection, submissions_collection, \
+    user_badges_collection, users_collection
+from models import UserBadge
+
+logger = logging.getLogger(__name__)
+
+RULES_TTL_SECONDS = int(os.environ.get('BADGE_RULES_TTL', 300))
+BACKFILL_BATCH_SIZE = 500
+
+CHALLENGES_COMPLETED = "challenges_completed"
+MIN_COMPLIANCE = "min_compliance"
+
+
+async def _challenges_completed(user_ids: List[str]) -> Dict[str, float]:
+    """Distinct challenges with at least one passed submission"""
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}, "status": "passed"}},
+        {"$group": {"_id": {"user_id": "$user_id", "challenge_id": "$challenge_id"}}},
+        {"$group": {"_id": "$_id.user_id", "value": {"$sum": 1}}},
+    ]
+    return {row["_id"]: row["value"] async for row in submissions_collection.aggregate(pipeline)}
+
+
+async def _min_compliance(user_ids: List[str]) -> Dict[str, float]:
+    """Lowest compliance across a user's subjects; users without subjects have none"""
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "value": {"$min": "$compliance"}}},
+    ]
+    return {row["_id"]: row["value"] async for row in subjects_collection.aggregate(pipeline)}
+
+
+# Metric name -> bulk computation for a batch of users
+METRICS: Dict[str, Callable[[List[str]], Awaitable[Dict[str, float]]]] = {
+    CHALLENGES_COMPLETED: _challenges_completed,
+    MIN_COMPLIANCE: _min_compliance,
+}
+
+
+class RuleIndex:
+    """Badge criteria, indexed by the metrics they depend on"""
+
+    def __init__(self, badges: List[dict]):
+        self.criteria: Dict[str, Dict[str, float]] = {}
+        self.by_metric: Dict[str, Set[str]] = defaultdict(set)
+        for badge in badges:
+            criteria = badge.get("criteria") or {}
+            unknown = [metric for metric in criteria if metric not in METRICS]
+            if unknown or not criteria:
+                logger.warning(f"Badge {badge['id']} has unsupported criteria {criteria}; it cannot be awarded")
+                continue
+            self.criteria[badge["id"]] = criteria
+            for metric in criteria:
+                self.by_metric[metric].add(badge["id"])
+
+    def satisfied(self, badge_id: str, values: Dict[str, Dict[str, float]], user_id: str) -> bool:
+        return all(
+            values[metric].get(user_id) is not None and values[metric][user_id] >= threshold
+            for metric, threshold in self.criteria[badge_id].items()
+        )
+
+
+_rules: Optional[RuleIndex] = None
+_rules_loaded_at = 0.0
+
+
+async def get_rules() -> RuleIndex:
+    """The rule index, reloaded every RULES_TTL_SECONDS to pick up badge changes"""
+    global _rules, _rules_loaded_at
+    if _rules is None or time.monotonic() - _rules_loaded_at > RULES_TTL_SECONDS:
+        badges = await badges_collection.find({}, {"_id": 0, "id": 1, "criteria": 1}).to_list(None)
+        _rules, _rules_loaded_at = RuleIndex(badges), time.monotonic()
+    return _rules
+
+
+def invalidate_rules():
+    global _rules
+    _rules = None
+
+
+async def _award(rules: RuleIndex, user_ids: List[str], candidates: Set[str]) -> Dict[str, List[str]]:
+    """Evaluate candidate badges for a batch of users and record the ones newly earned"""
+    earned = defaultdict(set)
+    async for row in user_badges_collection.find(
+        {"user_id": {"$in": user_ids}, "badge_id": {"$in": list(candidates)}, "earned": True},
+        {"_id": 0, "user_id": 1, "badge_id": 1}
+    ):
+        earned[row["user_id"]].add(row["badge_id"])
+
+    open_badges = {user_id: candidates - earned[user_id] for user_id in user_ids}
+    metrics = {metric for badges in open_badges.values() for badge in badges for metric in rules.criteria[badge]}
+    if not metrics:
+        return {}
+    metric_names = sorted(metrics)
+    results = await asyncio.gather(*(METRICS[metric](user_ids) for metric in metric_names))
+    values = dict(zip(metric_names, results))
+
+    awarded = defaultdict(list)
+    operations = []
+    for user_id, badges in open_badges.items():
+        for badge_id in sorted(badges):
+            if rules.satisfied(badge_id, values, user_id):
+                awarded[user_id].append(badge_id)
+                user_badge = UserBadge(user_id=user_id, badge_id=badge_id)
+                operations.append(UpdateOne(
+                    {"user_id": user_id, "badge_id": badge_id},
+                    {"$set": {"earned": True}, "$setOnInsert": user_badge.dict(exclude={"earned"})},
+                    upsert=True
+                ))
+    if operations:
+        await user_badges_collection.bulk_write(operations, ordered=False)
+    return dict(awarded)
+
+
+async def on_metric_changed(user_id: str, *metrics: str) -> List[str]:
+    """Re-evaluate the badges that depend on `metrics` for one user; returns newly earned badge ids"""
+    rules = await get_rules()
+    candidates = set().union(*(rules.by_metric.get(metric, set()) for metric in metrics))
+    if not candidates:
+        return []
+    awarded = await _award(rules, [user_id], candidates)
+    return awarded.get(user_id, [])
+
+
+async def backfill(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Evaluate every badge for every user, batch by batch; returns the number of awards"""
+    rules = await get_rules()
+    candidates = set(rules.criteria)
+    total = 0
+    last_id = None
+    while candidates:
+        query = {"id": {"$gt": last_id}} if last_id is not None else {}
+        cursor = users_collection.find(query, {"_id": 0, "id": 1}).sort("id", 1).limit(batch_size)
+        users = await cursor.to_list(batch_size)
+        if not users:
+            break
+        user_ids = [user["id"] for user in users]
+        awarded = await _award(rules, user_ids, candidates)
+        total += sum(len(badges) for badges in awarded.values())
+        last_id = user_ids[-1]
+        logger.info(f"Badge backfill: {len(user_ids)} users up to {last_id}, {total} badges awarded so far")
+    return total
+
+
+async def main(batch_size: int):
+    awarded = await backfill(batch_size)
+    print(f"✅ Badge backfill complete, {awarded} badges awarded")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backfill", action="store_true", required=True, help="award badges to every user")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().batch_size))
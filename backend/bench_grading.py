@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the grading engine
+
+Grades 1M synthetic subjects (3-8 components each) with grade_packed and
+classify, and times pack_components on a smaller batch of component dicts.
+
+Usage:
+    python bench_grading.py [--subjects N] [--pack-subjects N] [--runs N]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from grading import ComponentArrays, classify, grade_packed, pack_components
+
+
+def synthetic_arrays(num_subjects: int, rng: np.random.Generator) -> ComponentArrays:
+    per_subject = rng.integers(3, 9, size=num_subjects)
+    segment = np.repeat(np.arange(num_subjects), per_subject)
+    total = rng.choice([10.0, 20.0, 50.0, 100.0], size=segment.size)
+    return ComponentArrays(
+        scored=np.round(total * rng.random(segment.size), 1),
+        total=total,
+        weight=rng.random(segment.size),
+        pending=rng.random(segment.size) < 0.2,
+        segment=segment,
+        num_subjects=num_subjects,
+    )
+
+
+def time_runs(fn, runs: int):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def main(args):
+    rng = np.random.default_rng(42)
+    arrays = synthetic_arrays(args.subjects, rng)
+
+    median, best = time_runs(lambda: classify(grade_packed(arrays)), args.runs)
+    print(f"Grade + classify {args.subjects:,} subjects ({arrays.segment.size:,} components)")
+    print(f"  median: {median:.1f} ms   best: {best:.1f} ms")
+
+    subjects = [
+        [{"name": f"c{j}", "scored": 15, "total": 20, "weight": 0.25, "pending": j == 3} for j in range(4)]
+        for _ in range(args.pack_subjects)
+    ]
+    median, best = time_runs(lambda: pack_components(subjects), args.runs)
+    print(f"Pack {args.pack_subjects:,} subjects from component dicts")
+    print(f"  median: {median:.1f} ms   best: {best:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subjects", type=int, default=1_000_000)
+    parser.add_argument("--pack-subjects", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    main(parser.parse_args())
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the fast JSON list path
+
+Seeds 1,000 tasks for one user into a separate database and compares
+requests/second for the full list on two routes:
+
+  models  the original handler, [Task(**t) for t in docs] returned through
+          response_model=List[Task] and FastAPI's stdlib JSON encoder
+  fast    GET /api/tasks, which projects in Mongo and streams the documents
+          encoded with fast_json (orjson when installed)
+
+Requests go through the ASGI app in-process, so the numbers cover Mongo,
+the handler and serialization but not the HTTP server. The per-response
+serialization time of both paths is also reported on its own, from the
+same documents already in memory.
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python bench_json.py [--tasks N] [--seconds S] [--concurrency C]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+os.environ.setdefault("DB_NAME", "tacticalgrade_bench")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import fast_json
+from database import db, tasks_collection
+from indexes import ensure_indexes
+from models import PriorityEnum, Task
+from pagination import MAX_PAGE_SIZE, STREAM_BATCH_SIZE
+from server import api_router
+
+BENCH_USER_ID = "bench-json-user"
+
+
+async def seed(num_tasks: int):
+    """Seed the bench user's tasks unless the bench database already has them"""
+    if await tasks_collection.count_documents({"user_id": BENCH_USER_ID}) == num_tasks:
+        print(f"♻️  Reusing seeded tasks in '{db.name}'")
+        return
+
+    await tasks_collection.delete_many({"user_id": BENCH_USER_ID})
+    now = datetime.utcnow()
+    await tasks_collection.insert_many([
+        Task(
+            user_id=BENCH_USER_ID,
+            title=f"Task {i}",
+            subject=random.choice(["CS301", "MATH201", "PHYS101"]),
+            due_date=now + timedelta(days=random.randint(0, 60)),
+            priority=random.choice(list(PriorityEnum)),
+            urgency=random.randint(0, 100),
+            completed=random.random() < 0.3,
+        ).dict()
+        for i in range(num_tasks)
+    ])
+    print(f"📝 Seeded {num_tasks} tasks")
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/models/tasks", response_model=List[Task])
+    async def get_tasks_with_models(user_id: str):
+        tasks = await tasks_collection.find({"user_id": user_id}).to_list(None)
+        return [Task(**task) for task in tasks]
+
+    app.include_router(api_router)
+    return app
+
+
+async def measure(client: httpx.AsyncClient, url: str, seconds: float, concurrency: int):
+    """Requests/second and response size for `url` under `concurrency` clients"""
+    deadline = time.perf_counter() + seconds
+    completed = 0
+    size = 0
+
+    async def worker():
+        nonlocal completed, size
+        while time.perf_counter() < deadline:
+            response = await client.get(url)
+            response.raise_for_status()
+            size = len(response.content)
+            completed += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return completed / (time.perf_counter() - start), size
+
+
+async def serialization_ms(runs: int = 50):
+    """Median milliseconds to serialize the seeded list on each path, Mongo excluded"""
+    docs = await tasks_collection.find({"user_id": BENCH_USER_ID}, fast_json.response_projection(Task)).to_list(None)
+    field = create_response_field(name="response", type_=List[Task])
+
+    async def models():
+        content = await serialize_response(field=field, response_content=[Task(**doc) for doc in docs], is_coroutine=True)
+        return JSONResponse(content).body
+
+    async def fast():
+        chunks = range(0, len(docs), STREAM_BATCH_SIZE)
+        return b",".join(fast_json.dumps(docs[i:i + STREAM_BATCH_SIZE])[1:-1] for i in chunks)
+
+    timings = {}
+    for name, serialize in (("models", models), ("fast", fast)):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            await serialize()
+            samples.append((time.perf_counter() - start) * 1000)
+        timings[name] = statistics.median(samples)
+    return timings
+
+
+async def run(args):
+    await ensure_indexes()
+    await seed(args.tasks)
+
+    routes = {
+        "models": f"/models/tasks?user_id={BENCH_USER_ID}",
+        "fast": f"/api/tasks?user_id={BENCH_USER_ID}&limit={args.tasks}",
+    }
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for url in routes.values():
+            await measure(client, url, 1, 1)  # warm up
+
+        results = {name: await measure(client, url, args.seconds, args.concurrency) for name, url in routes.items()}
+    serialization = await serialization_ms()
+
+    encoder = "orjson" if fast_json.orjson is not None else "stdlib json"
+    print("=" * 50)
+    print(f"GET {args.tasks} tasks, {args.concurrency} concurrent clients, {args.seconds:g}s per route")
+    for name, (rate, size) in results.items():
+        print(f"  {name:<7} {rate:8.1f} req/s   {size / 1024:7.1f} KiB   {serialization[name]:6.2f} ms serializing")
+    print(f"  speedup: {results['fast'][0] / results['models'][0]:.2f}x (fast path encoder: {encoder})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    if args.tasks > MAX_PAGE_SIZE:
+        parser.error(f"--tasks must fit in one page of /api/tasks (at most {MAX_PAGE_SIZE})")
+    asyncio.run(run(args))
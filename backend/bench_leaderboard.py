@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for the materialized leaderboard
+
+Seeds a synthetic dataset (100k users, 5M submissions by default) into a
+separate database, then reports how long the ranking takes to build from
+Mongo and to load from a snapshot, and p50/p99 latency of get_leaderboard
+(top K pages) and get_user_rank (rank plus neighbours).
+
+Usage:
+    MONGO_URL=mongodb://localhost:27017 python bench_leaderboard.py [--users N] [--submissions N] [--runs N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+
+os.environ.setdefault("DB_NAME", "tacticalgrade_bench")
+
+from database import db, users_collection, submissions_collection
+from indexes import ensure_indexes
+from leaderboard import Leaderboard, leaderboard
+from server import get_leaderboard, get_user_rank
+
+BATCH_SIZE = 10_000
+
+
+async def seed(num_users: int, num_submissions: int):
+    """Seed users and submissions unless the bench database already has them"""
+    if await users_collection.estimated_document_count() >= num_users:
+        print(f"♻️  Reusing seeded dataset in '{db.name}'")
+        return
+
+    await users_collection.drop()
+    await submissions_collection.drop()
+
+    user_ids = [f"bench-user-{i:06d}" for i in range(num_users)]
+    for start in range(0, num_users, BATCH_SIZE):
+        await users_collection.insert_many([
+            {
+                "id": uid,
+                "name": f"User {uid[-6:]}",
+                "email": f"{uid}@bench.local",
+                "avatar": f"https://api.dicebear.com/7.x/avataaars/svg?seed={uid}",
+                "points": random.randint(0, 20_000),
+            }
+            for uid in user_ids[start:start + BATCH_SIZE]
+        ], ordered=False)
+    print(f"👤 Seeded {num_users} users")
+
+    for start in range(0, num_submissions, BATCH_SIZE):
+        count = min(BATCH_SIZE, num_submissions - start)
+        await submissions_collection.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "user_id": random.choice(user_ids),
+                "challenge_id": f"challenge-{random.randint(1, 500):03d}",
+                "status": "passed" if random.random() < 0.6 else "failed",
+            }
+            for _ in range(count)
+        ], ordered=False)
+    print(f"📝 Seeded {num_submissions} submissions")
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    await seed(args.users, args.submissions)
+    await ensure_indexes()
+
+    start = time.perf_counter()
+    await leaderboard.rebuild_and_snapshot(1)
+    build_seconds = time.perf_counter() - start
+    board = Leaderboard()
+    start = time.perf_counter()
+    await board.start()
+    load_seconds = time.perf_counter() - start
+    await board.stop()
+    await leaderboard.start()
+
+    user_ids = [user_id for user_id, *_ in leaderboard.index.rows()]
+    queries = {
+        "top K": lambda i: get_leaderboard(limit=args.limit, offset=(i * args.limit) % max(1, min(args.users, 5_000))),
+        "rank": lambda i: get_user_rank(user_id=random.choice(user_ids), radius=5),
+    }
+    print("=" * 50)
+    print(f"Ranking {len(user_ids)} users: build {build_seconds:.2f} s, snapshot load {load_seconds:.2f} s")
+    for name, query in queries.items():
+        samples = []
+        for i in range(args.runs):
+            start = time.perf_counter()
+            await query(i)
+            samples.append((time.perf_counter() - start) * 1000)
+        print(f"  {name:<6} p50 {percentile(samples, 50):.3f} ms   p99 {percentile(samples, 99):.3f} ms   "
+              f"mean {statistics.mean(samples):.3f} ms  ({args.runs} runs, limit={args.limit})")
+    await leaderboard.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--submissions", type=int, default=5_000_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
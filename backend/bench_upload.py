@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Peak-memory benchmark for screenshot upload handling
+
+Compares the old path (read the whole upload, base64 it) with the image
+pipeline (chunked hashing, decode + downscale + JPEG re-encode). Each run
+happens in a fresh subprocess so the reported peak RSS growth is not
+polluted by earlier runs.
+
+Usage:
+    python bench_upload.py [--width 3000] [--height 2200] [--runs 3]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fastapi import UploadFile
+
+from image_pipeline import prepare_upload, read_upload
+
+
+def _status_mb(field: str) -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024  # kB
+    raise KeyError(field)
+
+
+def reset_peak_rss() -> float:
+    """Reset the kernel's peak-RSS mark (Linux >= 4.0) and return current RSS in MB"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return _status_mb("VmRSS")
+    except OSError:
+        # ru_maxrss (KiB on Linux) cannot be reset; growth will be understated
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_rss_mb() -> float:
+    try:
+        return _status_mb("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def old_path(upload: UploadFile) -> int:
+    contents = await upload.read()
+    return len(base64.b64encode(contents).decode('utf-8'))
+
+
+async def new_path(upload: UploadFile) -> int:
+    prepared = await prepare_upload(await read_upload(upload))
+    return len(prepared.image_base64)
+
+
+def run_child(path: str, image_path: str):
+    """Measure one request in this (fresh) process and print a JSON line"""
+    with open(image_path, "rb") as source:
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(source, spooled)
+    spooled.seek(0)
+    upload = UploadFile(file=spooled, filename="screenshot.png")
+
+    baseline = reset_peak_rss()
+    start = time.perf_counter()
+    payload = asyncio.run((old_path if path == "old" else new_path)(upload))
+    print(json.dumps({
+        "peak_growth_mb": round(peak_rss_mb() - baseline, 1),
+        "seconds": round(time.perf_counter() - start, 3),
+        "payload_bytes": payload,
+    }))
+
+
+def make_screenshot(width: int, height: int, path: str):
+    """Noisy PNG so it does not compress away like a blank image would"""
+    from PIL import Image
+
+    Image.frombytes("RGB", (width, height), os.urandom(width * height * 3)).save(path, "PNG", compress_level=1)
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = os.path.join(tmp, "screenshot.png")
+        make_screenshot(args.width, args.height, image_path)
+        print(f"Upload: {args.width}x{args.height} PNG, {os.path.getsize(image_path) / 1024 / 1024:.1f} MB")
+
+        for path in ("old", "new"):
+            results = [
+                json.loads(subprocess.check_output([sys.executable, __file__, "--child", path, image_path]))
+                for _ in range(args.runs)
+            ]
+            worst = max(results, key=lambda r: r["peak_growth_mb"])
+            print(f"{path:>4}: peak RSS +{worst['peak_growth_mb']} MB, "
+                  f"{min(r['seconds'] for r in results):.3f}s, "
+                  f"LLM payload {worst['payload_bytes'] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=3000)
+    parser.add_argument("--height", type=int, default=2200)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", nargs=2, metavar=("PATH", "IMAGE"), help=argparse.SUPPRESS)
+    parsed = parser.parse_args()
+    if parsed.child:
+        run_child(*parsed.child)
+    else:
+        main(parsed)
@@ -0,0 +1,88 @@
+"""
+Read-through cache for the challenge and badge catalogs
+
+Catalog responses are cached per worker as ready-to-send JSON bytes with
+an ETag, so a hit costs neither a Mongo round trip nor Pydantic
+serialization, and a client or CDN revalidating with If-None-Match gets
+a bodyless 304. Entries expire after CATALOG_CACHE_TTL seconds, which
+bounds how stale other workers and the challenge submission counters
+can be; writes in this process call invalidate() to drop them at once.
+"""
+import hashlib
+import os
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Response
+
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 60))
+CATALOG_CACHE_MAX_ENTRIES = 512
+
+# Always revalidate, which is a cheap 304 while the ETag still matches
+CACHE_CONTROL = "public, no-cache"
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+    headers: Dict[str, str]
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+class CatalogCache:
+    """Pre-serialized responses for one catalog collection"""
+
+    def __init__(self, name: str, ttl: int = CATALOG_CACHE_TTL, maxsize: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.name = name
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+        self.stats = {"hits": 0, "misses": 0}
+
+    def invalidate(self):
+        self._generation += 1
+        self._entries.clear()
+
+    async def get(
+        self,
+        key: Tuple,
+        load: Callable[[], Awaitable[Optional[Tuple[bytes, Dict[str, str]]]]],
+    ) -> Optional[CachedBody]:
+        """Cached body for key, calling load() on a miss; None if load found nothing"""
+        cached = self._entries.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        self.stats["misses"] += 1
+        generation = self._generation
+        loaded = await load()
+        if loaded is None:
+            return None
+        body, headers = loaded
+        cached = CachedBody(body, _etag(body), headers)
+        # Don't store a body read before an invalidation that happened meanwhile
+        if generation == self._generation:
+            self._entries[key] = cached
+        return cached
+
+
+def respond(cached: CachedBody, if_none_match: Optional[str]) -> Response:
+    """200 with the cached body, or 304 if the client already has this version"""
+    headers = {**cached.headers, "ETag": cached.etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(if_none_match, cached.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+challenge_catalog = CatalogCache("challenges")
+badge_catalog = CatalogCache("badges")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Denormalized submission counters on challenges
+
+submit_solution bumps Challenge.submissions and passed_submissions and
+recomputes success_rate in one update, so /challenges never aggregates the
+submissions collection. A reconciliation pass recounts the submissions of
+each challenge in batches and repairs counters that drifted, e.g. after a
+crash between storing a submission and counting it. A repair only applies
+if the counters did not move while the recount ran; otherwise the next
+pass picks it up. Counters only ever reflect real submission documents,
+so seeded challenges start at zero.
+
+Usage:
+    python challenge_stats.py [--batch-size 100]
+"""
+import asyncio
+import logging
+import os
+
+from pymongo import UpdateOne
+
+from catalog_cache import challenge_catalog
+from database import challenges_collection, submissions_collection
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL_SECONDS = int(os.environ.get('CHALLENGE_STATS_RECONCILE_SECONDS', 3600))
+RECONCILE_BATCH_SIZE = 100
+
+# Challenges written before passed_submissions existed start counting from 0;
+# reconcile() then recounts them from the submissions collection
+_PASSED_SO_FAR = {"$ifNull": ["$passed_submissions", 0]}
+
+
+def _success_rate(passed, total):
+    return {"$cond": [{"$gt": [total, 0]}, {"$divide": [passed, total]}, 0]}
+
+
+async def record_submission(challenge_id: str, passed: bool):
+    """Count one submission; a single update keeps the three fields consistent"""
+    submissions = {"$add": ["$submissions", 1]}
+    passed_submissions = {"$add": [_PASSED_SO_FAR, 1 if passed else 0]}
+    await challenges_collection.update_one(
+        {"id": challenge_id},
+        [{"$set": {
+            "submissions": submissions,
+            "passed_submissions": passed_submissions,
+            "success_rate": _success_rate(passed_submissions, submissions),
+        }}]
+    )
+
+
+async def reconcile(batch_size: int = RECONCILE_BATCH_SIZE) -> int:
+    """Recount every challenge's submissions and fix drifted counters; returns challenges repaired"""
+    repaired = 0
+    last_id = None
+    while True:
+        query = {"id": {"$gt": last_id}} if last_id is not None else {}
+        cursor = challenges_collection.find(
+            query, {"_id": 0, "id": 1, "submissions": 1, "passed_submissions": 1}
+        ).sort("id", 1).limit(batch_size)
+        challenges = await cursor.to_list(batch_size)
+        if not challenges:
+            return repaired
+        last_id = challenges[-1]["id"]
+
+        counts = {
+            row["_id"]: row
+            async for row in submissions_collection.aggregate([
+                {"$match": {"challenge_id": {"$in": [c["id"] for c in challenges]}}},
+                {"$group": {
+                    "_id": "$challenge_id",
+                    "submissions": {"$sum": 1},
+                    "passed_submissions": {"$sum": {"$cond": [{"$eq": ["$status", "passed"]}, 1, 0]}},
+                }},
+            ])
+        }
+
+        operations = []
+        for challenge in challenges:
+            actual = counts.get(challenge["id"], {"submissions": 0, "passed_submissions": 0})
+            if (challenge.get("submissions"), challenge.get("passed_submissions")) == \
+                    (actual["submissions"], actual["passed_submissions"]):
+                continue
+            total, passed = actual["submissions"], actual["passed_submissions"]
+            operations.append(UpdateOne(
+                # Compare-and-set: skip if a submission was counted meanwhile
+                {
+                    "id": challenge["id"],
+                    "submissions": challenge.get("submissions"),
+                    "passed_submissions": challenge.get("passed_submissions"),
+                },
+                {"$set": {
+                    "submissions": total,
+                    "passed_submissions": passed,
+                    "success_rate": passed / total if total else 0,
+                }}
+            ))
+        if operations:
+            result = await challenges_collection.bulk_write(operations, ordered=False)
+            repaired += result.modified_count
+            challenge_catalog.invalidate()
+            logger.info(f"Challenge stats: repaired {result.modified_count} challenges up to {last_id}")
+
+
+async def reconcile_periodically(interval: float = RECONCILE_INTERVAL_SECONDS):
+    """Run reconcile every `interval` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile()
+        except Exception as e:
+            logger.error(f"Challenge stats reconciliation failed: {e}")
+
+
+async def main(batch_size: int):
+    repaired = await reconcile(batch_size)
+    print(f"✅ Challenge stats reconciled, {repaired} challenges repaired")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args().batch_size))
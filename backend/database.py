@@ -3,11 +3,13 @@ import os
 from dotenv import load_dotenv
 from pathlib import Path
 
+from metrics import MongoCommandMetrics
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Collections
@@ -15,7 +17,20 @@ users_collection = db['users']
 subjects_collection = db['subjects']
 tasks_collection = db['tasks']
 challenges_collection = db['challenges']
+challenge_tests_collection = db['challenge_tests']
 submissions_collection = db['submissions']
 badges_collection = db['badges']
 user_badges_collection = db['user_badges']
 legacy_timeline_collection = db['legacy_timeline']
+
+# Caches and background work
+screenshot_cache_collection = db['screenshot_cache']
+analysis_jobs_collection = db['analysis_jobs']
+submission_cache_collection = db['submission_cache']
+
+# Seeding state and lease, see seeding.py
+seed_state_collection = db['seed_state']
+
+# Materialized leaderboard snapshots, see leaderboard.py
+leaderboard_snapshots_collection = db['leaderboard_snapshots']
+leaderboard_snapshot_chunks_collection = db['leaderboard_snapshot_chunks']
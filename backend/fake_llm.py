@@ -0,0 +1,83 @@
+"""
+Local stand-in for the LLM provider
+
+FakeLlmChat mimics the LlmChat interface used by llm_pool and answers with
+canned, well-formed responses after a simulated latency, either whole or
+streamed word by word. Enable it with LLM_BACKEND=fake or
+llm_pool.set_chat_factory(FakeLlmChat).
+
+    FAKE_LLM_LATENCY_MS    mean simulated latency (default 800)
+    FAKE_LLM_JITTER_MS     uniform jitter added on top (default 400)
+    FAKE_LLM_FAILURE_RATE  fraction of calls that raise (default 0)
+"""
+import asyncio
+import json
+import os
+import random
+import re
+from typing import AsyncIterator
+
+SCREENSHOT_RESPONSE = {
+    "subjects": [
+        {
+            "name": "Data Structures",
+            "code": "CS201",
+            "components": [
+                {"name": "Quiz 1", "score": 18, "total": 20, "percentage": 90},
+                {"name": "Assignment 1", "score": 26, "total": 30, "percentage": 86.7}
+            ],
+            "overall": 88,
+            "compliance": 88,
+            "status": "on-track"
+        }
+    ],
+    "tactical_moves": ["Secure Assignment 2 to push CS201 above 90%"]
+}
+
+INSIGHTS_RESPONSE = [
+    {"type": "tactical-move", "subject": "Data Structures", "message": "Finish Assignment 2 early", "priority": "high"},
+    {"type": "compliance-alert", "subject": "Calculus", "message": "Compliance is below 85%", "priority": "medium"},
+    {"type": "achievement", "subject": "Physics", "message": "Excellent streak, keep it up", "priority": "low"}
+]
+
+MENTOR_RESPONSE = (
+    "Solid attempt! Consider the empty-input edge case and replace the nested "
+    "loop with a hash map to bring this down to O(n)."
+)
+
+
+class FakeLlmChat:
+    """Drop-in for LlmChat(...).with_model(...) that never leaves the process"""
+
+    calls = 0
+
+    def __init__(self, session_id: str, system_message: str):
+        self.session_id = session_id
+        self.system_message = system_message
+        self.latency = float(os.getenv("FAKE_LLM_LATENCY_MS", 800)) / 1000
+        self.jitter = float(os.getenv("FAKE_LLM_JITTER_MS", 400)) / 1000
+        self.failure_rate = float(os.getenv("FAKE_LLM_FAILURE_RATE", 0))
+
+    def _respond(self, message) -> str:
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Simulated provider failure")
+        if getattr(message, "images", None):
+            return json.dumps(SCREENSHOT_RESPONSE)
+        if "JSON array" in getattr(message, "text", ""):
+            return json.dumps(INSIGHTS_RESPONSE)
+        return MENTOR_RESPONSE
+
+    async def send_message(self, message) -> str:
+        FakeLlmChat.calls += 1
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        return self._respond(message)
+
+    async def stream_message(self, message) -> AsyncIterator[str]:
+        """Same response, one word at a time; the first word arrives after a third of the latency"""
+        FakeLlmChat.calls += 1
+        total = self.latency + random.uniform(0, self.jitter)
+        await asyncio.sleep(total / 3)
+        words = re.findall(r"\S+\s*", self._respond(message))
+        for word in words:
+            yield word
+            await asyncio.sleep(total * 2 / 3 / len(words))
@@ -0,0 +1,50 @@
+"""
+Fast JSON responses built straight from Mongo documents
+
+The default FastAPI path turns every document into a Pydantic model in the
+handler, validates it again against response_model and encodes the result
+with the stdlib json module. Handlers can opt out of all three: project the
+documents to the response shape in Mongo with response_projection() and
+return them in a FastJSONResponse, which encodes with orjson. Keep
+response_model on the route so the OpenAPI schema stays accurate; FastAPI
+does not re-validate a Response returned by the handler.
+
+orjson is optional; without it the same responses fall back to the stdlib
+encoder.
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Encode documents read from Mongo (datetimes included) as compact JSON"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def response_projection(model: Type[BaseModel]) -> Dict[str, int]:
+    """Mongo projection returning exactly the fields of a response model"""
+    return {"_id": 0, **{field: 1 for field in model.model_fields}}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse for content that is already plain JSON-compatible data"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,200 @@
+"""
+Grading engine shared by the subject, simulation, stats and insights code
+
+Components are packed into flat NumPy arrays with a segment index per
+subject, so any number of subjects is graded with a handful of vectorized
+operations instead of Python loops.
+
+Pending components only count towards a grade once a score is supplied
+for them (e.g. by a what-if scenario).
+"""
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+from models import Component, ComponentTarget, StatusEnum, TargetRequirement
+
+# Lower bounds of the status ladder, ascending; a grade at or above a bound
+# moves up one rung
+STATUS_THRESHOLDS = np.array([75.0, 85.0, 90.0])
+STATUS_LADDER = (StatusEnum.critical, StatusEnum.at_risk, StatusEnum.on_track, StatusEnum.excellent)
+_LADDER_ARRAY = np.array(STATUS_LADDER, dtype=object)
+STATUS_MIN_GRADE: Dict[StatusEnum, float] = dict(zip(STATUS_LADDER[1:], STATUS_THRESHOLDS.tolist()))
+DEFAULT_TARGETS = (StatusEnum.excellent, StatusEnum.on_track)
+
+# Slack for float noise when deciding whether a target is already reached
+_EPSILON = 1e-9
+
+ComponentLike = Union[Component, dict]
+
+
+class ComponentArrays(NamedTuple):
+    """Components of many subjects flattened into parallel arrays"""
+    scored: np.ndarray
+    total: np.ndarray
+    weight: np.ndarray
+    pending: np.ndarray
+    segment: np.ndarray  # index of the owning subject for each component
+    num_subjects: int
+
+
+def _field(component: ComponentLike, name: str, default=None):
+    if isinstance(component, dict):
+        return component.get(name, default)
+    return getattr(component, name, default)
+
+
+def pack_components(subjects: Sequence[Iterable[ComponentLike]]) -> ComponentArrays:
+    """Flatten a list of component lists (one per subject) into ComponentArrays"""
+    rows = [
+        (
+            _field(c, "scored", 0) or 0,
+            _field(c, "total", 0) or 0,
+            _field(c, "weight", 0) or 0,
+            bool(_field(c, "pending", False)),
+            i,
+        )
+        for i, components in enumerate(subjects)
+        for c in components
+    ]
+    columns = list(zip(*rows)) if rows else [(), (), (), (), ()]
+    return ComponentArrays(
+        scored=np.asarray(columns[0], dtype=float),
+        total=np.asarray(columns[1], dtype=float),
+        weight=np.asarray(columns[2], dtype=float),
+        pending=np.asarray(columns[3], dtype=bool),
+        segment=np.asarray(columns[4], dtype=np.intp),
+        num_subjects=len(subjects),
+    )
+
+
+def _ratio(scored: np.ndarray, total: np.ndarray) -> np.ndarray:
+    return np.divide(scored, total, out=np.zeros(np.broadcast(scored, total).shape), where=total > 0)
+
+
+def classify(grades: np.ndarray) -> List[StatusEnum]:
+    """Map an array of grades onto the status ladder"""
+    buckets = np.searchsorted(STATUS_THRESHOLDS, grades, side="right")
+    return _LADDER_ARRAY[np.atleast_1d(buckets)].tolist()
+
+
+def grade_packed(arrays: ComponentArrays) -> np.ndarray:
+    """Weighted grade (0-100) of every subject in `arrays`, skipping pending components"""
+    counted = ~arrays.pending
+    weighted = _ratio(arrays.scored, arrays.total) * arrays.weight * counted
+    earned = np.bincount(arrays.segment, weights=weighted, minlength=arrays.num_subjects)
+    possible = np.bincount(arrays.segment, weights=arrays.weight * counted, minlength=arrays.num_subjects)
+    return np.divide(earned, possible, out=np.zeros(arrays.num_subjects), where=possible > 0) * 100
+
+
+def grade_subjects(subjects: Sequence[Iterable[ComponentLike]]) -> Tuple[np.ndarray, List[StatusEnum]]:
+    """Grade many subjects in one bulk call; returns (grades, statuses)"""
+    grades = grade_packed(pack_components(subjects))
+    return grades, classify(grades)
+
+
+def grade_components(components: Iterable[ComponentLike]) -> Tuple[float, StatusEnum]:
+    """Grade a single subject's components"""
+    grades, statuses = grade_subjects([list(components)])
+    return float(grades[0]), statuses[0]
+
+
+def simulate_scenarios(
+    components: Sequence[ComponentLike],
+    scenarios: Sequence[Dict[str, float]],
+) -> Tuple[np.ndarray, List[StatusEnum]]:
+    """Grade what-if scenarios (component_name: score) for one subject as a matrix"""
+    arrays = pack_components([components])
+    index = {_field(c, "name"): i for i, c in enumerate(components)}
+
+    # One row per scenario, one column per component
+    scores = np.tile(arrays.scored, (len(scenarios), 1))
+    counted = np.tile(~arrays.pending, (len(scenarios), 1))
+    for row, scenario in enumerate(scenarios):
+        for name, score in scenario.items():
+            column = index.get(name)
+            if column is not None:
+                scores[row, column] = score
+                counted[row, column] = True
+
+    ratios = _ratio(scores, arrays.total)
+    earned = (ratios * counted) @ arrays.weight
+    possible = counted @ arrays.weight
+    grades = np.divide(earned, possible, out=np.zeros(len(scenarios)), where=possible > 0) * 100
+    return grades, classify(grades)
+
+
+def _ceil2(values: np.ndarray) -> np.ndarray:
+    """Round up to 2 decimals so reported minimums never fall short"""
+    return np.ceil(np.round(values * 100, 6)) / 100
+
+
+def solve_targets(
+    subjects: Sequence[Sequence[ComponentLike]],
+    targets: Sequence[StatusEnum] = DEFAULT_TARGETS,
+) -> Tuple[np.ndarray, List[List[TargetRequirement]]]:
+    """
+    Minimum scores on pending components needed to reach each target status.
+
+    With every component counted, a target grade T needs the pending
+    components to contribute deficit = T/100 * W - earned of weighted
+    score, where W is the total weight. Spread evenly that is a required
+    percentage of deficit / W_pending on each pending component; the floor
+    for one component is what remains when all the others score full marks.
+
+    Returns (current grade of each subject, requirements per subject).
+    """
+    arrays = pack_components(subjects)
+    seg, weight, pending = arrays.segment, arrays.weight, arrays.pending
+    n = arrays.num_subjects
+
+    weighted = _ratio(arrays.scored, arrays.total) * weight
+    earned = np.bincount(seg, weights=weighted * ~pending, minlength=n)
+    weight_all = np.bincount(seg, weights=weight, minlength=n)
+    weight_pending = np.bincount(seg, weights=weight * pending, minlength=n)
+    weight_graded = weight_all - weight_pending
+    current = np.divide(earned, weight_graded, out=np.zeros(n), where=weight_graded > 0) * 100
+
+    # Components grouped back per subject, pending ones only
+    names = [_field(c, "name") for components in subjects for c in components]
+    pending_rows = [[] for _ in range(n)]
+    for row in np.flatnonzero(pending):
+        pending_rows[seg[row]].append(row)
+
+    results = [[] for _ in range(n)]
+    for target in targets:
+        min_grade = STATUS_MIN_GRADE[target]
+        deficit = min_grade / 100 * weight_all - earned
+        required = np.divide(deficit, weight_pending, out=np.full(n, np.inf), where=weight_pending > 0)
+        required = np.maximum(required, 0)
+        secured = deficit <= _EPSILON
+        required[secured] = 0
+        achievable = secured | (required <= 1 + _EPSILON)
+
+        # Per pending component: even split and worst-case floor
+        min_scores = _ceil2(np.minimum(required[seg], 1) * arrays.total)
+        others = weight_pending[seg] - weight
+        floor_ratio = np.divide(deficit[seg] - others, weight, out=np.zeros(seg.size), where=weight > 0)
+        floor_scores = _ceil2(np.clip(floor_ratio, 0, 1) * arrays.total)
+
+        for i in range(n):
+            results[i].append(TargetRequirement(
+                target=target,
+                min_grade=min_grade,
+                achievable=bool(achievable[i]),
+                secured=bool(secured[i]),
+                required_percentage=(
+                    round(float(required[i]) * 100, 2) if np.isfinite(required[i]) else None
+                ),
+                components=[
+                    ComponentTarget(
+                        name=names[row],
+                        total=float(arrays.total[row]),
+                        min_score=float(min_scores[row]),
+                        floor_score=float(floor_scores[row]),
+                    )
+                    for row in pending_rows[i]
+                ],
+            ))
+
+    return current, results
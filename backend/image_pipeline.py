@@ -0,0 +1,113 @@
+"""
+Upload ingestion and preprocessing for screenshot analysis
+
+Uploads are read in chunks with a hard size cap while being hashed, then
+decoded, downscaled to what the vision model actually uses and re-encoded
+as a compact JPEG in a worker thread, off the event loop. Only the small
+re-encoded image is ever base64-encoded for the LLM.
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, NamedTuple
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps
+
+from screenshot_cache import difference_hash
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+
+# GPT-4o high-detail mode fits images into 2048x2048 and then scales the
+# short side down to 768px; anything larger is discarded by the provider
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+JPEG_QUALITY = int(os.environ.get('SCREENSHOT_JPEG_QUALITY', 85))
+
+# Refuse decompression bombs. Pillow only raises above twice its own limit
+# (and merely warns below that), so prepare_image enforces the limit itself
+# before anything is decoded; Pillow's check stays as a backstop
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 60_000_000))
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('IMAGE_WORKERS', min(4, os.cpu_count() or 1))),
+    thread_name_prefix="image-pipeline"
+)
+
+
+class Upload(NamedTuple):
+    file: BinaryIO  # rewound spooled upload, read lazily by the decoder
+    size: int
+    sha256: str
+
+
+class PreparedImage(NamedTuple):
+    image_base64: str
+    phash: int
+    width: int
+    height: int
+    encoded_bytes: int
+
+
+async def read_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> Upload:
+    """Hash the upload chunk by chunk, rejecting it as soon as it exceeds max_bytes"""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes // (1024 * 1024)} MB limit")
+        digest.update(chunk)
+    await file.seek(0)
+    return Upload(file=file.file, size=size, sha256=digest.hexdigest())
+
+
+def target_size(width: int, height: int) -> tuple:
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height), MAX_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(source: BinaryIO) -> PreparedImage:
+    """Decode, downscale and re-encode an image (blocking; run in the executor)"""
+    with Image.open(source) as image:
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            raise Image.DecompressionBombError(
+                f"Image size ({width * height} pixels) exceeds limit of {MAX_IMAGE_PIXELS} pixels"
+            )
+        # JPEG decoders can subsample while decoding, which avoids ever
+        # materializing the full-resolution bitmap
+        image.draft("RGB", target_size(*image.size))
+        image = ImageOps.exif_transpose(image, in_place=True) or image
+        # In-place reduce + resample, then convert the small image only
+        image.thumbnail(target_size(*image.size), Image.LANCZOS, reducing_gap=2.0)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        phash = difference_hash(image)
+        size = image.size
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    encoded = buffer.getvalue()
+    return PreparedImage(
+        image_base64=base64.b64encode(encoded).decode('utf-8'),
+        phash=phash,
+        width=size[0],
+        height=size[1],
+        encoded_bytes=len(encoded),
+    )
+
+
+async def prepare_upload(upload: Upload) -> PreparedImage:
+    """Run prepare_image on the pipeline's thread pool"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_executor, prepare_image, upload.file)
+    except (OSError, Image.DecompressionBombError) as e:  # includes UnidentifiedImageError
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image") from e
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Index management for TacticalGrade collections
+
+Declares the indexes the hot queries in server.py rely on, creates them on
+startup and can verify that none of those queries falls back to a COLLSCAN.
+
+Usage:
+    python indexes.py            # create missing indexes
+    python indexes.py --verify   # create indexes, then explain every planned query
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from database import db
+from jobs import JOB_TTL_SECONDS
+from screenshot_cache import CACHE_TTL_SECONDS
+from submission_cache import SUBMISSION_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_USER_ID = "demo-user-001"
+SAMPLE_ID = "sample-id"
+
+
+def _unique_id() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True, name="id_unique")
+
+
+# Collection name -> indexes it needs
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        _unique_id(),
+        IndexModel([("points", DESCENDING), ("id", ASCENDING)], name="points_desc"),
+    ],
+    "subjects": [
+        _unique_id(),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_id_created_at_id"
+        ),
+    ],
+    "tasks": [
+        _unique_id(),
+        IndexModel([("user_id", ASCENDING), ("completed", ASCENDING)], name="user_id_completed"),
+        IndexModel(
+            [("user_id", ASCENDING), ("completed", ASCENDING), ("urgency", DESCENDING), ("due_date", ASCENDING)],
+            name="user_id_completed_urgency_desc_due_date"
+        ),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_id_created_at_id"
+        ),
+    ],
+    "challenges": [
+        _unique_id(),
+    ],
+    "challenge_tests": [
+        IndexModel([("challenge_id", ASCENDING)], unique=True, name="challenge_id_unique"),
+    ],
+    "submissions": [
+        _unique_id(),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_id_status"),
+        IndexModel(
+            [("user_id", ASCENDING), ("submitted_at", ASCENDING), ("id", ASCENDING)], name="user_id_submitted_at_id"
+        ),
+        IndexModel([("challenge_id", ASCENDING), ("status", ASCENDING)], name="challenge_id_status"),
+        # Leaderboard builds count passed submissions per user from this index alone
+        IndexModel([("status", ASCENDING), ("user_id", ASCENDING)], name="status_user_id"),
+    ],
+    "badges": [
+        _unique_id(),
+    ],
+    "user_badges": [
+        _unique_id(),
+        IndexModel([("user_id", ASCENDING), ("earned", ASCENDING)], name="user_id_earned"),
+        IndexModel([("user_id", ASCENDING), ("badge_id", ASCENDING)], unique=True, name="user_id_badge_id_unique"),
+    ],
+    "legacy_timeline": [
+        _unique_id(),
+        IndexModel(
+            [("user_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)],
+            name="user_id_date_desc_id_desc"
+        ),
+    ],
+    "screenshot_cache": [
+        _unique_id(),
+        IndexModel([("bands", ASCENDING)], name="bands"),
+        IndexModel([("last_hit_at", ASCENDING)], name="last_hit_at"),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=CACHE_TTL_SECONDS, name="created_at_ttl"),
+    ],
+    "analysis_jobs": [
+        _unique_id(),
+        IndexModel([("sha256", ASCENDING), ("status", ASCENDING)], name="sha256_status"),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=JOB_TTL_SECONDS, name="created_at_ttl"),
+    ],
+    "submission_cache": [
+        _unique_id(),
+        IndexModel(
+            [("created_at", ASCENDING)], expireAfterSeconds=SUBMISSION_CACHE_TTL_SECONDS, name="created_at_ttl"
+        ),
+    ],
+    "leaderboard_snapshots": [
+        _unique_id(),
+        IndexModel([("complete", ASCENDING), ("created_at", DESCENDING)], name="complete_created_at_desc"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    "leaderboard_snapshot_chunks": [
+        IndexModel([("snapshot_id", ASCENDING), ("chunk", ASCENDING)], unique=True, name="snapshot_id_chunk_unique"),
+    ],
+}
+
+# Representative shapes of the queries issued by server.py:
+# (collection, filter, sort)
+PLANNED_QUERIES = [
+    ("users", {"id": SAMPLE_USER_ID}, None),
+    ("users", {}, [("points", DESCENDING), ("id", ASCENDING)]),
+    ("users", {"id": {"$gt": SAMPLE_ID}}, [("id", ASCENDING)]),
+    ("subjects", {"id": SAMPLE_ID}, None),
+    ("subjects", {"user_id": SAMPLE_USER_ID}, None),
+    ("subjects", {"user_id": SAMPLE_USER_ID}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("tasks", {"id": SAMPLE_ID}, None),
+    ("tasks", {"user_id": SAMPLE_USER_ID}, None),
+    ("tasks", {"user_id": SAMPLE_USER_ID, "completed": True}, None),
+    ("tasks", {"user_id": SAMPLE_USER_ID, "completed": False}, None),
+    ("tasks", {"user_id": SAMPLE_USER_ID, "completed": False}, [("urgency", DESCENDING), ("due_date", ASCENDING)]),
+    ("tasks", {"user_id": SAMPLE_USER_ID}, [("created_at", ASCENDING), ("id", ASCENDING)]),
+    ("challenges", {"id": SAMPLE_ID}, None),
+    ("challenges", {"id": {"$gt": SAMPLE_ID}}, [("id", ASCENDING)]),
+    ("challenge_tests", {"challenge_id": SAMPLE_ID}, None),
+    ("submissions", {"id": SAMPLE_ID}, None),
+    ("submissions", {"challenge_id": {"$in": [SAMPLE_ID]}}, None),
+    ("submissions", {"user_id": SAMPLE_USER_ID}, [("submitted_at", ASCENDING), ("id", ASCENDING)]),
+    ("submissions", {"user_id": SAMPLE_USER_ID, "status": "passed"}, None),
+    ("submissions", {"status": "passed"}, [("user_id", ASCENDING)]),
+    ("badges", {"id": {"$in": [SAMPLE_ID]}}, None),
+    ("badges", {"id": {"$gt": SAMPLE_ID}}, [("id", ASCENDING)]),
+    ("user_badges", {"user_id": SAMPLE_USER_ID, "earned": True}, None),
+    ("user_badges", {"user_id": {"$in": [SAMPLE_USER_ID]}, "badge_id": {"$in": [SAMPLE_ID]}, "earned": True}, None),
+    ("legacy_timeline", {"user_id": SAMPLE_USER_ID}, [("date", DESCENDING), ("id", DESCENDING)]),
+    ("screenshot_cache", {"id": SAMPLE_ID}, None),
+    ("screenshot_cache", {"bands": {"$in": ["0:00"]}}, None),
+    ("screenshot_cache", {}, [("last_hit_at", ASCENDING)]),
+    ("analysis_jobs", {"id": SAMPLE_ID}, None),
+    ("analysis_jobs", {"sha256": SAMPLE_ID, "status": {"$in": ["queued", "running"]}}, None),
+    ("submission_cache", {"id": SAMPLE_ID}, None),
+    ("leaderboard_snapshots", {"complete": True}, [("created_at", DESCENDING)]),
+    ("leaderboard_snapshots", {"created_at": {"$lt": datetime(2024, 1, 1)}}, None),
+    ("leaderboard_snapshot_chunks", {"snapshot_id": SAMPLE_ID}, [("chunk", ASCENDING)]),
+    ("leaderboard_snapshot_chunks", {"snapshot_id": {"$in": [SAMPLE_ID]}}, None),
+]
+
+
+class CollectionScanError(RuntimeError):
+    """Raised when a planned query is answered with a full collection scan"""
+
+
+async def ensure_indexes():
+    """Create every declared index (no-op for indexes that already exist)"""
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Typically duplicate ids left behind by older seeding; keep the
+            # server up but make the missing index obvious in the logs
+            logger.error(f"Index creation failed on '{collection_name}': {e}")
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+
+async def verify_query_plans():
+    """Explain every planned query and raise if any of them does a COLLSCAN"""
+    offenders = []
+    for collection_name, query, sort in PLANNED_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        if _has_collscan(explanation.get("queryPlanner", {}).get("winningPlan", {})):
+            offenders.append(f"{collection_name}.find({query}, sort={sort})")
+
+    if offenders:
+        raise CollectionScanError("COLLSCAN detected for: " + "; ".join(offenders))
+
+
+async def main(verify: bool):
+    await ensure_indexes()
+    print("✅ Indexes ensured")
+    if verify:
+        await verify_query_plans()
+        print(f"✅ {len(PLANNED_QUERIES)} query plans use indexes")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verify", action="store_true", help="fail if a planned query does a COLLSCAN")
+    asyncio.run(main(parser.parse_args().verify))
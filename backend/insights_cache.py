@@ -0,0 +1,83 @@
+"""
+Per-user cache and single-flight coalescing for tactical insights
+
+Insights are cached under a fingerprint of exactly the data the prompt is
+built from: subject compliance, pending components and open tasks. A
+request whose fingerprint matches the cached one is served without an LLM
+call, and concurrent requests for the same fingerprint share one
+in-flight generation. Writes that change a user's subjects or tasks drop
+the entry explicitly; the fingerprint also catches changes made through
+other workers.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from cachetools import TTLCache
+
+from models import TacticalInsight
+
+INSIGHTS_CACHE_TTL = int(os.environ.get('INSIGHTS_CACHE_TTL', 3600))
+
+# user_id -> (fingerprint, insights)
+_entries: TTLCache = TTLCache(maxsize=10000, ttl=INSIGHTS_CACHE_TTL)
+# (user_id, fingerprint) -> generation shared by concurrent requests
+_in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def fingerprint(subjects: List[dict], tasks: List[dict]) -> str:
+    """Stable hash of the fields the insights prompt depends on"""
+    subject_keys = sorted(
+        json.dumps(
+            [s.get("name"), s.get("compliance"), [c for c in s.get("components", []) if c.get("pending")]],
+            sort_keys=True, default=str
+        )
+        for s in subjects
+    )
+    task_keys = sorted(
+        json.dumps(
+            [t.get("id"), t.get("title"), t.get("subject"), t.get("due_date"), t.get("priority"), t.get("urgency")],
+            default=str
+        )
+        for t in tasks
+    )
+    digest = hashlib.sha256()
+    for line in subject_keys + ["--"] + task_keys:
+        digest.update(line.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def invalidate(user_id: str):
+    """Forget a user's cached insights after their subjects or tasks change"""
+    _entries.pop(user_id, None)
+
+
+async def get_or_generate(
+    user_id: str,
+    subjects: List[dict],
+    tasks: List[dict],
+    generate: Callable[[List[dict], List[dict]], Awaitable[List[TacticalInsight]]],
+) -> List[TacticalInsight]:
+    key = fingerprint(subjects, tasks)
+    cached = _entries.get(user_id)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    task = _in_flight.get((user_id, key))
+    if task is None:
+        task = asyncio.ensure_future(_generate_and_store(user_id, key, subjects, tasks, generate))
+        _in_flight[(user_id, key)] = task
+        task.add_done_callback(lambda _: _in_flight.pop((user_id, key), None))
+
+    # Shielded so one client disconnecting does not cancel the shared call
+    return await asyncio.shield(task)
+
+
+async def _generate_and_store(user_id, key, subjects, tasks, generate) -> List[TacticalInsight]:
+    insights = await generate(subjects, tasks)
+    if insights:  # an empty list is the failure fallback, don't pin it
+        _entries[user_id] = (key, insights)
+    return insights
@@ -0,0 +1,215 @@
+"""
+Asynchronous screenshot analysis jobs
+
+POST /analysis/screenshot?mode=async enqueues the prepared image on an
+in-process queue drained by a bounded pool of worker tasks and returns a
+job id straight away. Job state lives in Mongo, so GET /analysis/jobs/{id}
+and its SSE stream work from any worker. Provider errors are retried with
+exponential backoff, and an image that is already queued or running is
+not enqueued twice. A job whose worker died is reported as failed once it
+has gone JOB_STALE_SECONDS without an update.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, NamedTuple, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from ai_services import request_screenshot_analysis
+from database import analysis_jobs_collection
+import screenshot_cache
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.environ.get('ANALYSIS_JOB_WORKERS', 4))
+JOB_QUEUE_SIZE = int(os.environ.get('ANALYSIS_JOB_QUEUE_SIZE', 256))
+JOB_MAX_ATTEMPTS = int(os.environ.get('ANALYSIS_JOB_MAX_ATTEMPTS', 3))
+JOB_BACKOFF_SECONDS = float(os.environ.get('ANALYSIS_JOB_BACKOFF', 2))
+JOB_TTL_SECONDS = int(os.environ.get('ANALYSIS_JOB_TTL', 24 * 3600))
+# Unfinished jobs not touched for this long are assumed lost with their worker
+JOB_STALE_SECONDS = 600
+SSE_POLL_SECONDS = 1.0
+SSE_KEEPALIVE_SECONDS = 15.0
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue cannot take more work"""
+
+
+class _Job(NamedTuple):
+    id: str
+    sha256: str
+    phash: int
+    image_base64: str
+
+
+class AnalysisJobQueue:
+    """Bounded in-process queue of screenshot analyses with a fixed worker pool"""
+
+    def __init__(self, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE):
+        self.num_workers = workers
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._in_flight: Dict[str, asyncio.Future] = {}  # sha256 -> future of its job id
+        self._reserved = 0  # queue slots held by submits still writing to Mongo
+        self._done: Dict[str, asyncio.Event] = {}  # job id -> set when terminal
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.num_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, sha256: str, phash: int, image_base64: str) -> str:
+        """Enqueue an analysis, or return the id of an identical in-flight job"""
+        while True:
+            pending = self._in_flight.get(sha256)
+            if pending is None:
+                break
+            # Shielded: one caller giving up must not cancel the others' wait
+            job_id = await asyncio.shield(pending)
+            if job_id:
+                return job_id
+            # The submit we waited on failed; try again ourselves
+
+        # Reserve the image and a queue slot before the first await, so
+        # concurrent submits neither duplicate the job nor overfill the queue
+        if self._queue is None or self._queue.qsize() + self._reserved >= self.max_size:
+            raise QueueFull("Analysis queue is full, try again later")
+        reservation = asyncio.get_running_loop().create_future()
+        self._in_flight[sha256] = reservation
+        self._reserved += 1
+        job_id = None
+        try:
+            # Another worker may already be analyzing the same image
+            existing = await analysis_jobs_collection.find_one(
+                {
+                    "sha256": sha256,
+                    "status": {"$in": [QUEUED, RUNNING]},
+                    "updated_at": {"$gte": datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)}
+                },
+                {"_id": 0, "id": 1}
+            )
+            if existing:
+                job_id = existing["id"]
+                return job_id
+
+            job = _Job(str(uuid.uuid4()), sha256, phash, image_base64)
+            now = datetime.utcnow()
+            await analysis_jobs_collection.insert_one({
+                "id": job.id,
+                "sha256": sha256,
+                "status": QUEUED,
+                "attempts": 0,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            })
+            self._done[job.id] = asyncio.Event()
+            self._queue.put_nowait(job)  # cannot fail, the slot was reserved
+            job_id = job.id
+            return job_id
+        finally:
+            self._reserved -= 1
+            reservation.set_result(job_id)
+            # Only jobs queued here stay in flight; _work releases them when done
+            if job_id is None or job_id not in self._done:
+                self._in_flight.pop(sha256, None)
+
+    async def wait(self, job_id: str, timeout: float):
+        """Wait until a job handled by this process finishes, or for `timeout`"""
+        event = self._done.get(job_id)
+        if event is None:
+            await asyncio.sleep(timeout)
+            return
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        await analysis_jobs_collection.update_one({"id": job_id}, {"$set": fields})
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"Analysis job {job.id} crashed: {e}")
+            finally:
+                self._in_flight.pop(job.sha256, None)
+                event = self._done.pop(job.id, None)
+                if event:
+                    event.set()
+                self._queue.task_done()
+
+    async def _run(self, job: _Job):
+        for attempt in range(1, JOB_MAX_ATTEMPTS + 1):
+            await self._update(job.id, status=RUNNING, attempts=attempt)
+            try:
+                result = await request_screenshot_analysis(job.image_base64)
+            except Exception as e:
+                if attempt == JOB_MAX_ATTEMPTS:
+                    await self._update(job.id, status=FAILED, error=str(e))
+                    return
+                delay = JOB_BACKOFF_SECONDS * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+                logger.warning(f"Analysis job {job.id} attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+                await self._update(job.id, status=QUEUED, error=str(e))
+                await asyncio.sleep(delay)
+            else:
+                await screenshot_cache.store(job.sha256, job.phash, result)
+                await self._update(job.id, status=SUCCEEDED, result=result.dict(), error=None)
+                return
+
+
+analysis_jobs = AnalysisJobQueue()
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    job = await analysis_jobs_collection.find_one({"id": job_id}, {"_id": 0, "sha256": 0})
+    stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    if job and job["status"] not in TERMINAL_STATES and job["updated_at"] < stale_before:
+        # Lost with its worker: fail it so polling and the SSE stream both end.
+        # The filter leaves it alone if a live worker touched it meanwhile
+        job.update(status=FAILED, error="Job was lost, please resubmit", updated_at=datetime.utcnow())
+        await analysis_jobs_collection.update_one(
+            {"id": job_id, "status": {"$nin": list(TERMINAL_STATES)}, "updated_at": {"$lt": stale_before}},
+            {"$set": {"status": FAILED, "error": job["error"], "updated_at": job["updated_at"]}}
+        )
+    return job
+
+
+async def job_events(job: dict) -> AsyncIterator[str]:
+    """Server-sent events for a job: one event per status change, ending at a terminal state"""
+    last_status = None
+    idle = 0.0
+    while True:
+        if job["status"] != last_status:
+            last_status = job["status"]
+            idle = 0.0
+            yield f"event: {last_status}\ndata: {json.dumps(jsonable_encoder(job))}\n\n"
+            if last_status in TERMINAL_STATES:
+                return
+        elif idle >= SSE_KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+
+        await analysis_jobs.wait(job["id"], SSE_POLL_SECONDS)
+        idle += SSE_POLL_SECONDS
+        job = await get_job(job["id"]) or {**job, "status": FAILED, "error": "Job expired"}
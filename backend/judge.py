@@ -0,0 +1,197 @@
+"""
+Sandboxed test execution for challenge submissions
+
+Each test case runs in its own single-use judge_runner.py process with
+CPU-time, address-space, file and process rlimits plus a wall-clock
+timeout. A pool of runners is forked ahead of time and topped up in the
+background, so a test case never waits for interpreter start-up. The test
+cases of a submission run in parallel, at most JUDGE_WORKERS at a time
+across the whole server, and submissions beyond JUDGE_MAX_QUEUE are
+rejected with JudgeBusy instead of piling up behind a contest burst.
+
+Runners only report what the submission returned; whether a case passed
+is decided here against the expected output, which never leaves this
+process.
+
+The rlimits contain runaway code but are not a security boundary against
+hostile submissions on their own; run the API in a container without
+network access for that.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+JUDGE_WORKERS = int(os.environ.get('JUDGE_WORKERS', os.cpu_count() or 1))
+JUDGE_MAX_QUEUE = int(os.environ.get('JUDGE_MAX_QUEUE', 64))
+JUDGE_CPU_SECONDS = int(os.environ.get('JUDGE_CPU_SECONDS', 2))
+JUDGE_MEMORY_MB = int(os.environ.get('JUDGE_MEMORY_MB', 256))
+JUDGE_TIMEOUT_SECONDS = float(os.environ.get('JUDGE_TIMEOUT_SECONDS', 5))
+
+RUNNER = Path(__file__).parent / "judge_runner.py"
+SIGXCPU = 24
+MAX_ACTUAL_CHARS = 1000
+
+
+class JudgeBusy(Exception):
+    """Raised when the judge queue cannot take another submission"""
+
+
+def _truncate(value):
+    text = json.dumps(value)
+    return value if len(text) <= MAX_ACTUAL_CHARS else text[:MAX_ACTUAL_CHARS] + "..."
+
+
+def _json_kind(value) -> type:
+    # bool is an int subclass; check it first so True never passes for 1
+    for kind in (bool, int, float, str, list, dict):
+        if isinstance(value, kind):
+            return kind
+    return type(value)
+
+
+def _matches(actual, expected) -> bool:
+    """Equal in value and in JSON type at every level, so True != 1 and 1.0 != 1"""
+    kind = _json_kind(expected)
+    if _json_kind(actual) is not kind:
+        return False
+    if kind is list:
+        return len(actual) == len(expected) and all(map(_matches, actual, expected))
+    if kind is dict:
+        return actual.keys() == expected.keys() and all(_matches(actual[k], expected[k]) for k in expected)
+    return actual == expected
+
+
+class Judge:
+    """Runs test cases in pre-forked, single-use sandbox processes"""
+
+    def __init__(self, workers: int = JUDGE_WORKERS, max_queue: int = JUDGE_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._warm: List[asyncio.subprocess.Process] = []
+        self._refills = set()
+        self._pending = 0
+        self._workdir: Optional[str] = None
+
+    async def start(self):
+        # Empty scratch directory the unprivileged runners may write to
+        self._workdir = tempfile.mkdtemp(prefix="judge-")
+        os.chmod(self._workdir, 0o777)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._warm = list(await asyncio.gather(*(self._spawn() for _ in range(self.workers))))
+
+    async def stop(self):
+        for task in list(self._refills):
+            task.cancel()
+        await asyncio.gather(*self._refills, return_exceptions=True)
+        for process in self._warm:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        self._warm = []
+        shutil.rmtree(self._workdir, ignore_errors=True)
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-I", "-S", str(RUNNER), str(JUDGE_CPU_SECONDS), str(JUDGE_MEMORY_MB),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=self._workdir,
+            env={"PATH": "/usr/bin:/bin"},
+            start_new_session=True,
+        )
+
+    async def _refill(self):
+        self._warm.append(await self._spawn())
+
+    async def _take(self) -> asyncio.subprocess.Process:
+        """A ready runner, replaced in the background by a fresh one"""
+        process = None
+        while self._warm and process is None:
+            candidate = self._warm.pop()
+            if candidate.returncode is None:
+                process = candidate
+        if len(self._warm) + len(self._refills) < self.workers:
+            task = asyncio.create_task(self._refill())
+            self._refills.add(task)
+            task.add_done_callback(self._refills.discard)
+        return process or await self._spawn()
+
+    async def _run_case(self, job: dict) -> dict:
+        async with self._slots:
+            process = await self._take()
+            try:
+                stdout, _ = await asyncio.wait_for(
+                    process.communicate((json.dumps(job) + "\n").encode("utf-8")),
+                    JUDGE_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return {"error": "Time limit exceeded", "runtime_ms": JUDGE_TIMEOUT_SECONDS * 1000}
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                raise
+
+        try:
+            return json.loads(stdout.decode("utf-8").splitlines()[-1])
+        except (IndexError, ValueError):
+            if process.returncode == -SIGXCPU:
+                return {"error": "Time limit exceeded"}
+            if process.returncode < 0:
+                return {"error": f"Killed by signal {-process.returncode}"}
+            return {"error": f"Exited with code {process.returncode}"}
+
+    async def run(self, code: str, entry_point: str, cases: List[dict], harness: Optional[str] = None) -> List[dict]:
+        """Run code against every case in parallel and return per-case results in order"""
+        if self._slots is None:
+            raise RuntimeError("Judge has not been started")
+        if self._pending >= self.max_queue:
+            raise JudgeBusy("Judge is busy, try again shortly")
+
+        self._pending += 1
+        try:
+            outcomes = await asyncio.gather(*(
+                self._run_case({
+                    "code": code,
+                    "harness": harness,
+                    "entry_point": entry_point,
+                    "input": case["input"],
+                })
+                for case in cases
+            ))
+        finally:
+            self._pending -= 1
+
+        results = []
+        for number, (case, outcome) in enumerate(zip(cases, outcomes), start=1):
+            # Decided here, never by the runner: the submission controls that process
+            passed = (
+                not outcome.get("error") and "actual" in outcome
+                and _matches(outcome["actual"], case["expected"])
+            )
+            result = {
+                "test_case": number,
+                "passed": passed,
+                "expected": case["expected"],
+                "actual": _truncate(outcome.get("actual")),
+                "runtime_ms": outcome.get("runtime_ms"),
+                "peak_memory_kb": outcome.get("peak_memory_kb"),
+            }
+            if outcome.get("error"):
+                result["error"] = outcome["error"]
+            results.append(result)
+        return results
+
+
+judge = Judge()
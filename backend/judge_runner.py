@@ -0,0 +1,101 @@
+"""
+Single-use sandbox process for the challenge judge
+
+Started ahead of time by judge.py with the interpreter already booted. It
+locks itself down first (resource limits, unprivileged user), then blocks
+reading one job from stdin, runs the submission against that one test case
+and writes the outcome as a JSON line to the original stdout. It then
+exits, so nothing a submission does can leak into the next test case.
+
+The runner never sees the expected output and does not decide whether the
+case passed; judge.py compares the returned value itself. A submission can
+reach anything in this process, so the outcome it reports is untrusted.
+
+Usage (by judge.py only):
+    python -I -S judge_runner.py <cpu_seconds> <memory_mb>
+"""
+import io
+import json
+import os
+import resource
+import sys
+import time
+
+NOBODY = 65534
+MAX_OPEN_FILES = 64
+MAX_FILE_BYTES = 1024 * 1024
+
+
+def lock_down(cpu_seconds: int, memory_mb: int):
+    # SIGXCPU at the soft limit tells the judge it was a time limit; SIGKILL a second later
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (MAX_OPEN_FILES, MAX_OPEN_FILES))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if os.getuid() == 0:
+        # Root could raise the hard limits again; run the submission as nobody
+        os.setgroups([])
+        os.setgid(NOBODY)
+        os.setuid(NOBODY)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+
+
+def run(job: dict) -> dict:
+    namespace = {"__name__": "__submission__"}
+    outcome = {"actual": None, "runtime_ms": 0.0}
+    try:
+        exec(compile(job["code"], "<submission>", "exec"), namespace)
+        if job.get("harness"):
+            exec(compile(job["harness"], "<harness>", "exec"), namespace)
+        entry_point = namespace.get(job["entry_point"])
+        if not callable(entry_point):
+            outcome["error"] = f"Function '{job['entry_point']}' is not defined"
+            return outcome
+
+        start = time.perf_counter()
+        actual = entry_point(*job["input"])
+        outcome["runtime_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        try:
+            # Round-trip so tuples compare equal to the stored JSON lists
+            actual = json.loads(json.dumps(actual))
+        except (TypeError, ValueError):
+            outcome["actual"] = repr(actual)
+            outcome["error"] = "Return value is not JSON serializable"
+            return outcome
+        outcome["actual"] = actual
+    except MemoryError:
+        outcome["error"] = "Memory limit exceeded"
+    except RecursionError:
+        outcome["error"] = "Maximum recursion depth exceeded"
+    except BaseException as e:  # includes SystemExit from the submission
+        outcome["error"] = f"{type(e).__name__}: {e}"
+    return outcome
+
+
+def main(cpu_seconds: int, memory_mb: int):
+    lock_down(cpu_seconds, memory_mb)
+    result_fd = os.dup(sys.stdout.fileno())
+    os.set_inheritable(result_fd, False)
+    result_stream = os.fdopen(result_fd, "w")
+    job = json.loads(sys.stdin.readline())
+
+    # Whatever the submission prints is discarded rather than mixed into the
+    # result, at the fd level too so os.write(1, ...) goes nowhere
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    os.close(devnull)
+    sys.stdout = sys.stderr = io.StringIO()
+    sys.stdin = io.StringIO()
+    outcome = run(job)
+    outcome["peak_memory_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result_stream.write(json.dumps(outcome, default=repr) + "\n")
+    result_stream.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]), int(sys.argv[2]))
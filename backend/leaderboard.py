@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Materialized leaderboard
+
+Every worker keeps the whole ranking in memory as a RankIndex: a sorted
+array of (-points, user_id) keys plus each user's row. Rank lookups bisect
+the array, so "top K" and "my rank plus neighbours" cost O(log n + K) and
+no Mongo round trip; updates move one key. Ties on points are broken by
+user id, like the aggregation this replaces.
+
+The index is persisted as chunked snapshots, so a new worker loads a few
+large documents instead of ranking every user. Workers stay consistent in
+one of two ways:
+
+- With a replica set, each worker follows a change stream on users and
+  passed submissions, resuming from the token stored with the snapshot it
+  loaded. Every write, from any worker, reaches every index within
+  milliseconds. A passed submission re-counts that user's passed
+  submissions rather than adding one, so an event for a submission that
+  the initial build already counted cannot count it twice.
+- On a standalone mongod (no change streams), this worker's passed
+  submissions are applied immediately and every LEADERBOARD_REFRESH_SECONDS
+  one worker rebuilds the index from Mongo and saves a snapshot, which the
+  others load. Points changed by another worker show up within one
+  refresh. Set LEADERBOARD_SYNC=refresh to skip change streams, e.g. for a
+  Mongo fake.
+
+A snapshot's id is the start of its time bucket (LEADERBOARD_SNAPSHOT_SECONDS
+when streaming, LEADERBOARD_REFRESH_SECONDS when refreshing), so the first
+worker to insert it wins and the others skip that bucket.
+
+Usage:
+    python leaderboard.py --rebuild    # rank every user now and save a snapshot
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from database import db, leaderboard_snapshot_chunks_collection, leaderboard_snapshots_collection, \
+    submissions_collection, users_collection
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 30))
+LEADERBOARD_SNAPSHOT_SECONDS = int(os.environ.get('LEADERBOARD_SNAPSHOT_SECONDS', 300))
+# "auto" follows a change stream when the deployment has them; "refresh" never tries
+LEADERBOARD_SYNC = os.environ.get('LEADERBOARD_SYNC', 'auto').lower()
+SNAPSHOT_CHUNK_SIZE = 10_000
+SNAPSHOTS_KEPT = 2
+STREAM_RETRY_SECONDS = 5
+
+# Server error codes meaning change streams are unavailable on this deployment
+CHANGE_STREAMS_UNSUPPORTED = {40573}
+# ... or that the resume token fell off the oplog
+CHANGE_STREAM_HISTORY_LOST = {280, 286}
+
+CHANGE_PIPELINE = [
+    {"$match": {"$or": [
+        {"ns.coll": "submissions", "operationType": "insert", "fullDocument.status": "passed"},
+        {"ns.coll": "users", "operationType": {"$in": ["insert", "replace"]}},
+        {"ns.coll": "users", "operationType": "update", "$or": [
+            {"updateDescription.updatedFields.points": {"$exists": True}},
+            {"updateDescription.updatedFields.name": {"$exists": True}},
+            {"updateDescription.updatedFields.avatar": {"$exists": True}},
+        ]},
+    ]}},
+    {"$project": {
+        "operationType": 1, "ns": 1,
+        "fullDocument.id": 1, "fullDocument.user_id": 1, "fullDocument.points": 1,
+        "fullDocument.name": 1, "fullDocument.avatar": 1,
+    }},
+]
+
+
+class Row(NamedTuple):
+    points: int
+    solved: int
+    name: str
+    avatar: str
+
+
+class Ranked(NamedTuple):
+    rank: int
+    user_id: str
+    row: Row
+
+
+class RankIndex:
+    """Users ordered by points (descending) then id, with O(log n) rank lookups"""
+
+    def __init__(self, rows: Iterable[Tuple[str, Row]] = ()):
+        self._rows: Dict[str, Row] = dict(rows)
+        self._keys: List[Tuple[int, str]] = sorted((-row.points, user_id) for user_id, row in self._rows.items())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _move(self, user_id: str, row: Row):
+        old = self._rows.get(user_id)
+        if old is not None and old.points == row.points:
+            self._rows[user_id] = row
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old.points, user_id))]
+        insort(self._keys, (-row.points, user_id))
+        self._rows[user_id] = row
+
+    def set_user(self, user_id: str, points: int, name: str, avatar: str):
+        """Insert a user or update their points and profile, keeping their solved count"""
+        old = self._rows.get(user_id)
+        self._move(user_id, Row(points, old.solved if old else 0, name, avatar))
+
+    def add_solved(self, user_id: str, count: int = 1):
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._rows[user_id] = row._replace(solved=row.solved + count)
+
+    def set_solved(self, user_id: str, solved: int):
+        row = self._rows.get(user_id)
+        if row is not None:
+            self._rows[user_id] = row._replace(solved=solved)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        return bisect_left(self._keys, (-row.points, user_id)) + 1
+
+    def page(self, offset: int, limit: int) -> List[Ranked]:
+        return [
+            Ranked(offset + i + 1, user_id, self._rows[user_id])
+            for i, (_, user_id) in enumerate(self._keys[offset:offset + limit])
+        ]
+
+    def around(self, user_id: str, radius: int) -> List[Ranked]:
+        """The user and up to `radius` users ranked directly above and below"""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self.page(start, rank - start + radius)
+
+    def rows(self) -> List[list]:
+        """Snapshot rows in rank order: [user_id, points, solved, name, avatar]"""
+        return [[user_id, *self._rows[user_id]] for _, user_id in self._keys]
+
+
+class Leaderboard:
+    """The worker's RankIndex and the machinery keeping it in sync with Mongo"""
+
+    def __init__(self):
+        self.index = RankIndex()
+        self.ready = False
+        self.streaming = False
+        self.snapshot_id: Optional[str] = None
+        self._resume_token: Optional[dict] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # ---- writes made by this worker ----
+
+    def record_solve(self, user_id: str):
+        # A change stream delivers this worker's writes too; don't count them twice
+        if not self.streaming:
+            self.index.add_solved(user_id)
+
+    # ---- building and snapshots ----
+
+    async def build(self) -> RankIndex:
+        """Rank every user from the users and submissions collections"""
+        solved = {
+            row["_id"]: row["count"]
+            # Covered by the (status, user_id) index, already in user order
+            async for row in submissions_collection.aggregate([
+                {"$match": {"status": "passed"}},
+                {"$sort": {"user_id": 1}},
+                {"$project": {"_id": 0, "user_id": 1}},
+                {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+            ])
+        }
+        rows = []
+        async for user in users_collection.find({}, {"_id": 0, "id": 1, "points": 1, "name": 1, "avatar": 1}):
+            rows.append((user["id"], Row(
+                user.get("points", 0), solved.get(user["id"], 0), user.get("name", ""), user.get("avatar", "")
+            )))
+        logger.info(f"Leaderboard built from Mongo: {len(rows)} users")
+        return RankIndex(rows)
+
+    async def _claim_snapshot(self, period: int) -> Optional[str]:
+        """Reserve the snapshot for this `period`-second bucket; None if another worker already has"""
+        snapshot_id = str(int(time.time() // period * period))
+        try:
+            await leaderboard_snapshots_collection.insert_one(
+                {"id": snapshot_id, "complete": False, "created_at": datetime.utcnow()}
+            )
+        except DuplicateKeyError:
+            return None
+        return snapshot_id
+
+    async def _save_snapshot(self, snapshot_id: str, rows: List[list], resume_token: Optional[dict]):
+        for chunk, start in enumerate(range(0, len(rows), SNAPSHOT_CHUNK_SIZE)):
+            await leaderboard_snapshot_chunks_collection.insert_one(
+                {"snapshot_id": snapshot_id, "chunk": chunk, "rows": rows[start:start + SNAPSHOT_CHUNK_SIZE]}
+            )
+        await leaderboard_snapshots_collection.update_one(
+            {"id": snapshot_id},
+            {"$set": {"complete": True, "users": len(rows), "resume_token": resume_token,
+                      "completed_at": datetime.utcnow()}}
+        )
+        self.snapshot_id = snapshot_id
+        logger.info(f"Leaderboard snapshot {snapshot_id} saved: {len(rows)} users")
+        await self._prune_snapshots()
+
+    async def _prune_snapshots(self):
+        """Drop everything older than the last SNAPSHOTS_KEPT complete snapshots, abandoned claims included"""
+        kept = await leaderboard_snapshots_collection.find(
+            {"complete": True}, {"_id": 0, "created_at": 1}
+        ).sort("created_at", DESCENDING).limit(SNAPSHOTS_KEPT).to_list(None)
+        if len(kept) < SNAPSHOTS_KEPT:
+            return
+        old = await leaderboard_snapshots_collection.find(
+            {"created_at": {"$lt": kept[-1]["created_at"]}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        if old:
+            ids = [snapshot["id"] for snapshot in old]
+            await leaderboard_snapshot_chunks_collection.delete_many({"snapshot_id": {"$in": ids}})
+            await leaderboard_snapshots_collection.delete_many({"id": {"$in": ids}})
+
+    async def _latest_snapshot(self) -> Optional[dict]:
+        return await leaderboard_snapshots_collection.find_one(
+            {"complete": True}, {"_id": 0}, sort=[("created_at", DESCENDING)]
+        )
+
+    async def _load_snapshot(self, snapshot: dict) -> RankIndex:
+        rows = []
+        async for chunk in leaderboard_snapshot_chunks_collection.find(
+            {"snapshot_id": snapshot["id"]}, {"_id": 0, "rows": 1}
+        ).sort("chunk", 1):
+            rows.extend((user_id, Row(*values)) for user_id, *values in chunk["rows"])
+        self.snapshot_id = snapshot["id"]
+        logger.info(f"Leaderboard snapshot {snapshot['id']} loaded: {len(rows)} users")
+        return RankIndex(rows)
+
+    async def rebuild_and_snapshot(self, period: int) -> bool:
+        """Rebuild from Mongo and save a snapshot if this bucket's snapshot is still unclaimed"""
+        snapshot_id = await self._claim_snapshot(period)
+        if snapshot_id is None:
+            return False
+        self.index = await self.build()
+        await self._save_snapshot(snapshot_id, self.index.rows(), None)
+        return True
+
+    # ---- staying in sync ----
+
+    async def _apply(self, change: dict):
+        document = change.get("fullDocument")
+        if not document:
+            return
+        if change["ns"]["coll"] == "submissions":
+            # An absolute count: replaying an event the build already saw changes nothing
+            user_id = document["user_id"]
+            solved = await submissions_collection.count_documents({"user_id": user_id, "status": "passed"})
+            self.index.set_solved(user_id, solved)
+        else:
+            self.index.set_user(
+                document["id"], document.get("points", 0), document.get("name", ""), document.get("avatar", "")
+            )
+
+    async def _follow_changes(self):
+        """Apply changes from a change stream; falls back to refreshing if there is none"""
+        if LEADERBOARD_SYNC == "refresh":
+            await self._refresh_periodically()
+            return
+        while True:
+            token = self._resume_token
+            try:
+                async with db.watch(CHANGE_PIPELINE, full_document="updateLookup", start_after=token) as stream:
+                    if token is None:
+                        # Fresh stream: anything written from here on arrives as an event,
+                        # and may also be in the build; applying it again is harmless
+                        self.index = await self.build()
+                    self._resume_token = stream.resume_token
+                    self.streaming = True
+                    async for change in stream:
+                        await self._apply(change)
+                        self._resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.streaming = False
+                code = getattr(e, "code", None)
+                if code in CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable; refreshing the leaderboard periodically")
+                    await self._refresh_periodically()
+                    return
+                if code in CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Leaderboard resume token expired; rebuilding from Mongo")
+                    self._resume_token = None
+                    continue
+                logger.error(f"Leaderboard change stream failed: {e}")
+            except Exception as e:
+                self.streaming = False
+                logger.error(f"Leaderboard change stream failed: {e}")
+            await asyncio.sleep(STREAM_RETRY_SECONDS)
+
+    async def _refresh_periodically(self):
+        while True:
+            await asyncio.sleep(LEADERBOARD_REFRESH_SECONDS)
+            try:
+                if not await self.rebuild_and_snapshot(LEADERBOARD_REFRESH_SECONDS):
+                    # Another worker claimed this refresh; wait for its snapshot below
+                    await asyncio.sleep(LEADERBOARD_REFRESH_SECONDS / 2)
+                    latest = await self._latest_snapshot()
+                    if latest and latest["id"] != self.snapshot_id:
+                        self.index = await self._load_snapshot(latest)
+            except Exception as e:
+                logger.error(f"Leaderboard refresh failed: {e}")
+
+    async def _snapshot_periodically(self):
+        """While streaming, persist this worker's index for workers that start later"""
+        while True:
+            await asyncio.sleep(LEADERBOARD_SNAPSHOT_SECONDS)
+            if not self.streaming:
+                continue
+            try:
+                # Rows and token are read without an await in between, so they match
+                rows, token = self.index.rows(), self._resume_token
+                snapshot_id = await self._claim_snapshot(LEADERBOARD_SNAPSHOT_SECONDS)
+                if snapshot_id:
+                    await self._save_snapshot(snapshot_id, rows, token)
+            except Exception as e:
+                logger.error(f"Leaderboard snapshot failed: {e}")
+
+    async def start(self):
+        """Load the newest snapshot (or build one), then keep the index in sync"""
+        latest = await self._latest_snapshot()
+        if latest:
+            self.index = await self._load_snapshot(latest)
+            self._resume_token = latest.get("resume_token")
+        elif not await self.rebuild_and_snapshot(LEADERBOARD_SNAPSHOT_SECONDS):
+            self.index = await self.build()
+        self.ready = True
+        self._tasks = [
+            asyncio.create_task(self._follow_changes()),
+            asyncio.create_task(self._snapshot_periodically()),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+leaderboard = Leaderboard()
+
+
+async def main():
+    board = Leaderboard()
+    if not await board.rebuild_and_snapshot(1):
+        raise SystemExit("Another snapshot was saved this second; try again")
+    print(f"✅ Leaderboard snapshot {board.snapshot_id} saved with {len(board.index)} users")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", required=True, help="rank every user and save a snapshot")
+    parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,241 @@
+"""
+Bounded, fault-tolerant access to the LLM provider
+
+Each AI feature gets an LlmPool with its own concurrency limit, a bounded
+wait queue with a timeout, a per-call timeout and a circuit breaker. When
+the breaker is open or the queue is full, calls fail fast with
+LlmUnavailable so callers can fall back to their canned responses instead
+of piling up on a slow provider.
+
+Every call gets its own session id, so concurrent users never share
+conversation state. LlmChat objects only hold per-session history; the
+provider connections underneath are pooled by the client library, so a
+chat per call costs nothing but object setup.
+
+Every call is counted in the llm_* Prometheus metrics (see metrics.py).
+
+Set LLM_BACKEND=fake to route every pool to the latency-simulating fake
+in fake_llm.py.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, Callable, Optional
+
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+from metrics import record_llm_call
+from prompt_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+EMERGENT_LLM_KEY = os.getenv('EMERGENT_LLM_KEY')
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'openai')
+LLM_MODEL = os.getenv('LLM_MODEL', 'gpt-4o')
+
+
+class LlmUnavailable(Exception):
+    """Raised when a call is shed by the queue or the circuit breaker"""
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+
+def default_chat_factory(session_id: str, system_message: str):
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=system_message
+    ).with_model(LLM_PROVIDER, LLM_MODEL)
+
+
+def _initial_chat_factory() -> Callable:
+    if os.getenv('LLM_BACKEND', '').lower() == 'fake':
+        from fake_llm import FakeLlmChat
+        return FakeLlmChat
+    return default_chat_factory
+
+
+_chat_factory: Callable = _initial_chat_factory()
+
+
+def set_chat_factory(factory: Optional[Callable]):
+    """Swap the chat constructor for every pool (None restores the real client)"""
+    global _chat_factory
+    _chat_factory = factory or default_chat_factory
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def cancel_probe(self):
+        """Give back a half-open probe slot that never reached the provider"""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+def _outcome(error: Exception) -> str:
+    return "timeout" if isinstance(error, asyncio.TimeoutError) else "error"
+
+
+def _prompt_tokens(message: UserMessage) -> int:
+    return count_tokens(getattr(message, "text", "") or "")
+
+
+class LlmPool:
+    """Concurrency-limited, breaker-protected LLM access for one feature"""
+
+    def __init__(self, feature: str, system_message: str):
+        prefix = f"LLM_{feature.upper()}_"
+        self.feature = feature
+        self.system_message = system_message
+        self.concurrency = int(os.getenv(prefix + "CONCURRENCY", os.getenv("LLM_CONCURRENCY", 8)))
+        self.max_queue = int(os.getenv(prefix + "MAX_QUEUE", os.getenv("LLM_MAX_QUEUE", 64)))
+        self.queue_timeout = _env_float(prefix + "QUEUE_TIMEOUT", _env_float("LLM_QUEUE_TIMEOUT", 10))
+        self.call_timeout = _env_float(prefix + "CALL_TIMEOUT", _env_float("LLM_CALL_TIMEOUT", 45))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+            reset_timeout=_env_float("LLM_BREAKER_RESET", 30),
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._waiting = 0
+
+    async def _acquire(self) -> bool:
+        """Take a concurrency slot, returning whether this call is the breaker's probe"""
+        if self._waiting >= self.max_queue:
+            raise LlmUnavailable(f"{self.feature}: queue full")
+        is_probe = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            raise LlmUnavailable(f"{self.feature}: circuit open")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if is_probe:
+                self.breaker.cancel_probe()
+            raise LlmUnavailable(f"{self.feature}: timed out waiting for a slot")
+        except asyncio.CancelledError:
+            if is_probe:
+                self.breaker.cancel_probe()
+            raise
+        finally:
+            self._waiting -= 1
+        return is_probe
+
+    def _record_failure(self):
+        self.breaker.record_failure()
+        if self.breaker.state != "closed":
+            logger.warning(f"LLM circuit for '{self.feature}' is {self.breaker.state}")
+
+    async def send(self, message: UserMessage) -> str:
+        """Send one message in a fresh session, subject to the pool's limits"""
+        try:
+            is_probe = await self._acquire()
+        except LlmUnavailable:
+            record_llm_call(self.feature, "shed")
+            raise
+        start = time.perf_counter()
+        try:
+            chat = _chat_factory(f"{self.feature}-{uuid.uuid4()}", self.system_message)
+            response = await asyncio.wait_for(chat.send_message(message), self.call_timeout)
+        except asyncio.CancelledError:
+            if is_probe:
+                self.breaker.cancel_probe()
+            raise
+        except Exception as e:
+            self._record_failure()
+            record_llm_call(self.feature, _outcome(e), time.perf_counter() - start)
+            raise
+        else:
+            self.breaker.record_success()
+            record_llm_call(
+                self.feature, "ok", time.perf_counter() - start,
+                _prompt_tokens(message), count_tokens(response if isinstance(response, str) else str(response))
+            )
+            return response
+        finally:
+            self._semaphore.release()
+
+    async def stream(self, message: UserMessage) -> AsyncIterator[str]:
+        """
+        Like send, but yield the response in chunks as they arrive. Chats
+        without a stream_message method yield the whole response at once.
+        call_timeout bounds the wait for each chunk rather than the total.
+        """
+        try:
+            is_probe = await self._acquire()
+        except LlmUnavailable:
+            record_llm_call(self.feature, "shed")
+            raise
+        start = time.perf_counter()
+        received = []
+        try:
+            chat = _chat_factory(f"{self.feature}-{uuid.uuid4()}", self.system_message)
+            if not hasattr(chat, "stream_message"):
+                response = await asyncio.wait_for(chat.send_message(message), self.call_timeout)
+                received.append(response)
+                yield response
+            else:
+                chunks = chat.stream_message(message).__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.call_timeout)
+                    except StopAsyncIteration:
+                        break
+                    received.append(chunk)
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Consumer went away; that says nothing about the provider's health
+            if is_probe:
+                self.breaker.cancel_probe()
+            raise
+        except Exception as e:
+            self._record_failure()
+            record_llm_call(self.feature, _outcome(e), time.perf_counter() - start)
+            raise
+        else:
+            self.breaker.record_success()
+            record_llm_call(
+                self.feature, "ok", time.perf_counter() - start,
+                _prompt_tokens(message), count_tokens("".join(received))
+            )
+        finally:
+            self._semaphore.release()
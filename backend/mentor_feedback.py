@@ -0,0 +1,195 @@
+"""
+Background mentor feedback for challenge submissions
+
+Submitting a solution stores the submission and returns immediately; the
+mentor feedback is generated by a background task and saved on the
+submission document when complete. While it is being written, chunks are
+fanned out to any SSE subscribers in this process. Subscribers on other
+workers, or arriving after the fact, poll Mongo and get the finished text.
+
+A generation that died with its worker is restarted by the next reader
+once it has been in flight for longer than FEEDBACK_STALE_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from ai_services import stream_coding_mentor_feedback, MENTOR_FALLBACK
+from database import submissions_collection
+from jobs import SSE_POLL_SECONDS, SSE_KEEPALIVE_SECONDS
+from models import FeedbackStatusEnum, Submission
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_STALE_SECONDS = int(os.environ.get('MENTOR_FEEDBACK_STALE_SECONDS', 120))
+
+PENDING, STREAMING = FeedbackStatusEnum.pending.value, FeedbackStatusEnum.streaming.value
+READY, FAILED = FeedbackStatusEnum.ready.value, FeedbackStatusEnum.failed.value
+FEEDBACK_PROJECTION = {"_id": 0, "id": 1, "code": 1, "test_results": 1,
+                       "mentor_feedback": 1, "feedback_status": 1, "feedback_started_at": 1}
+
+
+class _Generation:
+    """Chunks of one in-progress feedback, with wake-ups for subscribers"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.status = STREAMING
+        self.feedback: Optional[str] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, feedback: str, status: str):
+        self.feedback, self.status = feedback, status
+        self._notify()
+
+    async def wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+# submission id -> generation running in this process
+_generations: Dict[str, _Generation] = {}
+# Strong references so running tasks are not garbage collected
+_tasks: Set[asyncio.Task] = set()
+
+
+async def _claim_abandoned(submission_id: str, stale_before: datetime) -> bool:
+    """Take over unfinished feedback whose generation started before stale_before"""
+    query = {
+        "id": submission_id,
+        "feedback_status": {"$nin": [READY, FAILED]},
+        "$or": [{"feedback_started_at": None}, {"feedback_started_at": {"$lt": stale_before}}],
+    }
+    result = await submissions_collection.update_one(
+        query, {"$set": {"feedback_status": STREAMING, "feedback_started_at": datetime.utcnow()}}
+    )
+    return result.modified_count == 1
+
+
+async def _generate(
+    submission_id: str,
+    code: str,
+    test_results: List[dict],
+    generation: _Generation,
+    on_ready: Optional[Callable[[str], Awaitable[None]]],
+):
+    feedback, status = MENTOR_FALLBACK, FAILED
+    try:
+        try:
+            async for chunk in stream_coding_mentor_feedback(code, test_results):
+                generation.append(chunk)
+            feedback, status = "".join(generation.chunks), READY
+        except Exception as e:
+            logger.error(f"Mentor feedback for submission {submission_id} failed: {e}")
+
+        await submissions_collection.update_one(
+            {"id": submission_id},
+            {"$set": {"mentor_feedback": feedback, "feedback_status": status}}
+        )
+        if on_ready is not None and status == READY:
+            try:
+                await on_ready(feedback)
+            except Exception as e:
+                logger.warning(f"Storing mentor feedback for submission {submission_id} elsewhere failed: {e}")
+    finally:
+        # Also reached on cancellation, so subscribers here are never left hanging
+        _generations.pop(submission_id, None)
+        generation.finish(feedback, status)
+
+
+def _spawn(submission_id: str, code: str, test_results: List[dict], on_ready=None):
+    generation = _Generation()
+    _generations[submission_id] = generation
+    task = asyncio.create_task(_generate(submission_id, code, test_results, generation, on_ready))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def start_feedback(submission: Submission, on_ready: Optional[Callable[[str], Awaitable[None]]] = None):
+    """
+    Begin generating feedback for a submission stored with feedback_status
+    streaming; on_ready is awaited with the text once it is saved
+    """
+    _spawn(submission.id, submission.code, submission.test_results, on_ready)
+
+
+async def get_feedback(submission_id: str) -> Optional[dict]:
+    """Feedback state of a submission, restarting generation if it was abandoned"""
+    submission = await submissions_collection.find_one({"id": submission_id}, FEEDBACK_PROJECTION)
+    if not submission:
+        return None
+
+    status = submission.get("feedback_status", PENDING)
+    if status not in (READY, FAILED) and submission_id not in _generations:
+        started_at = submission.get("feedback_started_at")
+        cutoff = datetime.utcnow() - timedelta(seconds=FEEDBACK_STALE_SECONDS)
+        # Submissions from before background feedback have no status at all
+        if (started_at is None or started_at < cutoff) and await _claim_abandoned(submission_id, cutoff):
+            logger.warning(f"Restarting abandoned mentor feedback for submission {submission_id}")
+            _spawn(submission_id, submission.get("code", ""), submission.get("test_results", []))
+            status = STREAMING
+
+    return {
+        "submission_id": submission_id,
+        "feedback_status": status,
+        "mentor_feedback": submission.get("mentor_feedback"),
+    }
+
+
+async def stop_feedback():
+    """Cancel in-flight generations; readers restart them once they go stale"""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def feedback_events(state: dict) -> AsyncIterator[str]:
+    """
+    Server-sent events for a submission's feedback: a "chunk" event per
+    piece of text as it is generated here, then one "done" event carrying
+    the full feedback and its final status
+    """
+    submission_id = state["submission_id"]
+    sent = 0
+    idle = 0.0
+    while True:
+        if state["feedback_status"] in (READY, FAILED):
+            yield _event("done", state)
+            return
+
+        generation = _generations.get(submission_id)
+        if generation is not None:
+            while sent < len(generation.chunks):
+                yield _event("chunk", {"text": generation.chunks[sent]})
+                sent += 1
+                idle = 0.0
+            if generation.feedback is not None:
+                state = {**state, "feedback_status": generation.status, "mentor_feedback": generation.feedback}
+                continue
+            await generation.wait(SSE_POLL_SECONDS)
+        else:
+            # Being generated by another worker; the finished text lands in Mongo
+            await asyncio.sleep(SSE_POLL_SECONDS)
+            state = await get_feedback(submission_id) or {**state, "feedback_status": FAILED}
+
+        idle += SSE_POLL_SECONDS
+        if idle >= SSE_KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
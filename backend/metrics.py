@@ -0,0 +1,188 @@
+"""
+Prometheus metrics for requests, Mongo and the LLM
+
+MetricsMiddleware times every HTTP request per route template and records
+request and response payload sizes. A pymongo command listener counts
+every Mongo round trip (getMore included) and its duration, both globally
+per command and per request, so a route that issues one query per item
+shows up as a high mongo_round_trips_per_request for that route. LlmPool
+reports call counts, latency and token usage per AI feature; tokens are
+counted with prompt_builder.count_tokens, since the chat client does not
+return the provider's usage.
+
+Everything is exposed at /metrics. With several worker processes, set
+PROMETHEUS_MULTIPROC_DIR to a shared, empty directory so /metrics
+aggregates all of them.
+"""
+import contextvars
+import os
+import threading
+import time
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, \
+    generate_latest
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+import profiling
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+# Requests that matched no route share one label, so scanners can't blow up the series count
+UNMATCHED_ROUTE = "unmatched"
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+http_request_size = Histogram(
+    "http_request_size_bytes", "HTTP request body size", ["method", "route"], buckets=SIZE_BUCKETS
+)
+http_response_size = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ["method", "route"], buckets=SIZE_BUCKETS
+)
+mongo_commands = Counter("mongo_commands_total", "Mongo commands sent", ["command", "outcome"])
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "Mongo command round-trip time", ["command"], buckets=MONGO_BUCKETS
+)
+mongo_round_trips_per_request = Histogram(
+    "mongo_round_trips_per_request", "Mongo commands issued while serving one request", ["method", "route"],
+    buckets=ROUND_TRIP_BUCKETS
+)
+mongo_time_per_request = Histogram(
+    "mongo_time_per_request_seconds", "Time spent waiting on Mongo while serving one request",
+    ["method", "route"], buckets=LATENCY_BUCKETS
+)
+llm_calls = Counter("llm_calls_total", "LLM calls by feature and outcome", ["feature", "outcome"])
+llm_call_duration = Histogram(
+    "llm_call_duration_seconds", "LLM call latency, queueing excluded", ["feature"], buckets=LATENCY_BUCKETS
+)
+llm_tokens = Counter("llm_tokens_total", "LLM tokens sent and received (estimated)", ["feature", "kind"])
+llm_tokens_per_call = Histogram(
+    "llm_tokens_per_call", "LLM prompt and completion size (estimated)", ["feature", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+
+
+class RequestStats:
+    """Mongo work done on behalf of one request; updated from Motor's executor threads"""
+
+    def __init__(self):
+        self.round_trips = 0
+        self.mongo_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.round_trips += 1
+            self.mongo_seconds += seconds
+
+
+# Motor copies the caller's context into its executor, so the listener sees the request's stats
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Pass to the Mongo client's event_listeners to time every command"""
+
+    def started(self, event):
+        pass
+
+    def _record(self, event, outcome: str):
+        seconds = event.duration_micros / 1e6
+        mongo_commands.labels(event.command_name, outcome).inc()
+        mongo_command_duration.labels(event.command_name).observe(seconds)
+        record_round_trip(seconds)
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+
+def record_round_trip(seconds: float = 0.0):
+    """Count a Mongo round trip for the current request, for clients without command monitoring"""
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add(seconds)
+
+
+def record_llm_call(feature: str, outcome: str, seconds: Optional[float] = None,
+                    prompt_tokens: int = 0, completion_tokens: int = 0):
+    llm_calls.labels(feature, outcome).inc()
+    if seconds is not None:
+        llm_call_duration.labels(feature).observe(seconds)
+    for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if tokens:
+            llm_tokens.labels(feature, kind).inc(tokens)
+            llm_tokens_per_call.labels(feature, kind).observe(tokens)
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, payload sizes and Mongo work per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        profile = profiling.start()
+        start = time.perf_counter()
+        status = 500
+        request_bytes = response_bytes = 0
+
+        async def receive_counting():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_counting(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_counting, send_counting)
+        finally:
+            duration = time.perf_counter() - start
+            method, route = scope["method"], _route(scope)
+            http_request_duration.labels(method, route, str(status)).observe(duration)
+            http_request_size.labels(method, route).observe(request_bytes)
+            http_response_size.labels(method, route).observe(response_bytes)
+            mongo_round_trips_per_request.labels(method, route).observe(stats.round_trips)
+            mongo_time_per_request.labels(method, route).observe(stats.mongo_seconds)
+            profiling.finish(profile, duration, method, route, stats.round_trips)
+            _request_stats.reset(token)
+
+
+def render() -> tuple:
+    """Body and content type for the /metrics endpoint"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
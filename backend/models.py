@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -20,6 +20,12 @@ class DifficultyEnum(str, Enum):
     medium = 'medium'
     hard = 'hard'
 
+class FeedbackStatusEnum(str, Enum):
+    pending = 'pending'
+    streaming = 'streaming'
+    ready = 'ready'
+    failed = 'failed'
+
 class RarityEnum(str, Enum):
     common = 'common'
     rare = 'rare'
@@ -78,6 +84,35 @@ class SimulationResponse(BaseModel):
     compliance: float
     status: StatusEnum
 
+class BatchSimulationRequest(BaseModel):
+    scenarios: List[Dict[str, float]] = []  # each: component_name: score
+    grid: Optional[Dict[str, List[float]]] = None  # component_name: candidate scores, expanded as a cartesian product
+
+class BatchSimulationResponse(BaseModel):
+    scenarios: List[dict]
+    predicted_grades: List[float]
+    statuses: List[StatusEnum]
+
+class ComponentTarget(BaseModel):
+    name: str
+    total: float
+    min_score: float  # needed on this component when every pending component scores the same percentage
+    floor_score: float  # lowest possible score here if the other pending components get full marks
+
+class TargetRequirement(BaseModel):
+    target: StatusEnum
+    min_grade: float
+    achievable: bool
+    secured: bool  # reached even with zero on every pending component
+    required_percentage: Optional[float] = None
+    components: List[ComponentTarget]
+
+class SubjectTargets(BaseModel):
+    subject_id: str
+    subject_name: str
+    current_grade: float
+    requirements: List[TargetRequirement]
+
 # Task Models
 class Task(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -105,6 +140,13 @@ class TaskUpdate(BaseModel):
     urgency: Optional[int] = None
     completed: Optional[bool] = None
 
+class TaskPatch(TaskUpdate):
+    id: str
+
+class BulkTaskUpdateResponse(BaseModel):
+    matched: int
+    modified: int
+
 # Challenge Models
 class Challenge(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -112,6 +154,7 @@ class Challenge(BaseModel):
     difficulty: DifficultyEnum
     points: int
     submissions: int = 0
+    passed_submissions: int = 0
     success_rate: float = 0.0
     tags: List[str]
     description: str
@@ -119,6 +162,17 @@ class Challenge(BaseModel):
     starter_code: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class TestCase(BaseModel):
+    input: List[Any]  # positional arguments for the entry point
+    expected: Any
+
+class ChallengeTests(BaseModel):
+    # Kept apart from Challenge so expected outputs are never served to clients
+    challenge_id: str
+    entry_point: str
+    harness: Optional[str] = None  # extra code defining the entry point, e.g. to build a tree from a list
+    cases: List[TestCase]
+
 class Submission(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -126,6 +180,9 @@ class Submission(BaseModel):
     code: str
     status: str
     test_results: List[dict]
+    mentor_feedback: Optional[str] = None
+    feedback_status: FeedbackStatusEnum = FeedbackStatusEnum.pending
+    feedback_started_at: Optional[datetime] = None
     submitted_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Badge Models
@@ -162,6 +219,11 @@ class LeaderboardEntry(BaseModel):
     avatar: str
     is_current_user: bool = False
 
+class LeaderboardPosition(BaseModel):
+    rank: Optional[int] = None
+    total_users: int
+    entries: List[LeaderboardEntry]
+
 # AI Models
 class TacticalInsight(BaseModel):
     type: str
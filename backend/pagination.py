@@ -0,0 +1,124 @@
+"""
+Keyset pagination, field projection and streamed JSON list responses
+
+List endpoints page with ?after=<id of last item>&limit=N and advertise the
+next cursor in the X-Next-Cursor header. Documents are projected to the
+response model in Mongo and streamed straight from the cursor, encoded in
+batches with fast_json, so a page is never held in memory as a whole and
+never goes through Pydantic.
+"""
+from typing import Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from fast_json import dumps, response_projection
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Documents encoded per chunk of a streamed page
+STREAM_BATCH_SIZE = 100
+
+# Sort specs always end on the unique "id" so the keyset is total
+ID_ORDER: List[Tuple[str, int]] = [("id", 1)]
+
+
+def build_projection(fields: Optional[str], model: Type[BaseModel]) -> Dict[str, int]:
+    """Turn ?fields=a,b into a Mongo projection, validated against the model"""
+    if not fields:
+        return response_projection(model)
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    projection = {"_id": 0, "id": 1}
+    projection.update({f: 1 for f in requested})
+    return projection
+
+
+def _keyset_filter(sort: List[Tuple[str, int]], anchor: dict) -> dict:
+    """Filter selecting documents strictly after the anchor in sort order"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: anchor.get(f) for f, _ in sort[:i]}
+        clause[field] = {"$gt" if direction == 1 else "$lt": anchor.get(field)}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+async def _stream_array(cursor):
+    yield b"["
+    separator = b""
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield separator + dumps(batch)[1:-1]
+            separator = b","
+            batch = []
+    if batch:
+        yield separator + dumps(batch)[1:-1]
+    yield b"]"
+
+
+async def _page(
+    collection,
+    query: dict,
+    model: Type[BaseModel],
+    after: Optional[str],
+    limit: int,
+    fields: Optional[str],
+    sort: List[Tuple[str, int]],
+):
+    """Cursor over one keyset page plus the headers advertising the next one"""
+    projection = build_projection(fields, model)
+    sort_fields = {f: 1 for f, _ in sort}
+
+    if after is not None:
+        if sort == ID_ORDER:
+            anchor = {"id": after}
+        else:
+            anchor = await collection.find_one({"id": after}, {"_id": 0, **sort_fields})
+            if anchor is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, _keyset_filter(sort, anchor)]}
+
+    # Peek at the last item of this page and the first of the next one with a
+    # covered index read, so the cursor can go out in a header before streaming
+    boundary = await collection.find(query, {"_id": 0, **sort_fields}).sort(sort).skip(limit - 1).limit(2).to_list(2)
+    headers = {NEXT_CURSOR_HEADER: boundary[0]["id"]} if len(boundary) == 2 else {}
+
+    return collection.find(query, projection).sort(sort).limit(limit), headers
+
+
+async def paginate(
+    collection,
+    query: dict,
+    model: Type[BaseModel],
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    sort: List[Tuple[str, int]] = ID_ORDER,
+) -> StreamingResponse:
+    """Stream one keyset page of `collection` matching `query` as a JSON array"""
+    cursor, headers = await _page(collection, query, model, after, limit, fields, sort)
+    return StreamingResponse(_stream_array(cursor), media_type="application/json", headers=headers)
+
+
+async def render_page(
+    collection,
+    query: dict,
+    model: Type[BaseModel],
+    after: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    fields: Optional[str] = None,
+    sort: List[Tuple[str, int]] = ID_ORDER,
+) -> Tuple[bytes, Dict[str, str]]:
+    """Like paginate, but return the page as JSON bytes, e.g. for caching"""
+    cursor, headers = await _page(collection, query, model, after, limit, fields, sort)
+    return b"".join([chunk async for chunk in _stream_array(cursor)]), headers
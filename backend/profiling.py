@@ -0,0 +1,84 @@
+"""
+Opt-in sampling profiler for slow requests
+
+Set PROFILE_SLOW_REQUESTS_MS to profile requests with pyinstrument and
+write a flamegraph for every one that takes longer than that many
+milliseconds. Profiles land in PROFILE_DIR as speedscope JSON (open them
+at https://www.speedscope.app) or, with PROFILE_FORMAT=html, as
+pyinstrument's own HTML view. File names carry the route, the duration and
+the number of Mongo round trips, so an N+1 stands out before the file is
+even opened.
+
+At most one request is profiled at a time, and PROFILE_SAMPLE_RATE
+(default 1.0) profiles only that fraction of requests, to bound the
+overhead on a busy worker.
+"""
+import logging
+import os
+import random
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0))
+PROFILE_INTERVAL_SECONDS = float(os.environ.get('PROFILE_INTERVAL_SECONDS', 0.001))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', '/tmp/tacticalgrade-profiles'))
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'speedscope').lower()
+
+_busy = threading.Lock()
+Profiler = None
+
+if PROFILE_SLOW_REQUESTS_MS > 0:
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("PROFILE_SLOW_REQUESTS_MS is set but pyinstrument is not installed; profiling is off")
+
+
+def start():
+    """Start profiling the current request if sampled; returns the profiler or None"""
+    if Profiler is None or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    if not _busy.acquire(blocking=False):
+        return None
+    profiler = Profiler(interval=PROFILE_INTERVAL_SECONDS, async_mode="enabled")
+    try:
+        profiler.start()
+    except Exception:
+        _busy.release()
+        raise
+    return profiler
+
+
+def finish(profiler, duration: float, method: str, route: str, round_trips: int):
+    """Stop the profiler and write its flamegraph if the request was slow"""
+    if profiler is None:
+        return
+    try:
+        profiler.stop()
+        elapsed_ms = duration * 1000
+        if elapsed_ms >= PROFILE_SLOW_REQUESTS_MS:
+            _write(profiler, elapsed_ms, method, route, round_trips)
+    except Exception as e:
+        logger.error(f"Writing request profile failed: {e}")
+    finally:
+        _busy.release()
+
+
+def _write(profiler, elapsed_ms: float, method: str, route: str, round_trips: int):
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    name = f"{stamp}-{method}-{slug}-{elapsed_ms:.0f}ms-{round_trips}q"
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    if PROFILE_FORMAT == "html":
+        path = PROFILE_DIR / f"{name}.html"
+        path.write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        path = PROFILE_DIR / f"{name}.speedscope.json"
+        path.write_text(profiler.output(renderer=SpeedscopeRenderer()), encoding="utf-8")
+    logger.warning(f"Slow request {method} {route} took {elapsed_ms:.0f} ms with {round_trips} Mongo round trips; profile at {path}")
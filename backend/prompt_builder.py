@@ -0,0 +1,143 @@
+"""
+Token-budgeted prompt construction for tactical insights
+
+Only the fields the model needs are projected, subjects are ranked by how
+much attention they need and tasks by urgency, due date and priority, and
+items are added in that order until the token budget for the data section
+is spent. Prompt size therefore stays flat no matter how much data a user
+accumulates.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_TOKEN_BUDGET = int(os.environ.get('INSIGHTS_PROMPT_TOKEN_BUDGET', 1500))
+
+PRIORITY_RANK = {"high": 0, "medium": 1, "low": 2}
+TASK_FIELDS = ("title", "subject", "due_date", "priority", "urgency")
+COMPONENT_FIELDS = ("name", "total", "weight")
+
+INSIGHTS_TEMPLATE = """Based on this student's academic data, provide 3 tactical insights:
+
+Subjects: {subjects}
+Tasks: {tasks}
+
+For each insight, identify:
+1. Type: 'tactical-move', 'compliance-alert', or 'achievement'
+2. Subject name
+3. Actionable message (concise, specific)
+4. Priority: 'high', 'medium', or 'low'
+
+Return JSON array format:
+[
+  {{"type": "tactical-move", "subject": "Subject Name", "message": "Focus on X to achieve Y", "priority": "high"}},
+  ...
+]"""
+
+_encoding = None
+
+
+class PromptStats(NamedTuple):
+    tokens: int
+    subjects_included: int
+    subjects_total: int
+    tasks_included: int
+    tasks_total: int
+
+
+def count_tokens(text: str) -> int:
+    """GPT-4o token count, or a ~4 chars/token estimate if tiktoken has no encoding available"""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model("gpt-4o")
+        except Exception:
+            _encoding = False  # e.g. no network to fetch the BPE file; don't retry
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _compact(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _as_date(value) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10] if value else None
+
+
+def project_task(task: Dict) -> Dict:
+    projected = {field: task.get(field) for field in TASK_FIELDS if task.get(field) is not None}
+    if "due_date" in projected:
+        projected["due_date"] = _as_date(projected["due_date"])
+    return projected
+
+
+def rank_tasks(tasks: List[Dict]) -> List[Dict]:
+    """Most urgent first, then earliest due, then highest priority"""
+    return sorted(
+        tasks,
+        key=lambda t: (
+            -(t.get("urgency") or 0),
+            _as_date(t.get("due_date")) or "9999-12-31",
+            PRIORITY_RANK.get(t.get("priority"), len(PRIORITY_RANK)),
+        )
+    )
+
+
+def _fit(items: List[Dict], budget: int) -> Tuple[List[Dict], int]:
+    """Longest prefix of items whose compact JSON fits in the budget"""
+    kept, used = [], 0
+    for item in items:
+        cost = count_tokens(_compact(item)) + 1  # separator
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return kept, used
+
+
+def build_insights_prompt(
+    subjects_summary: List[Dict],
+    tasks: List[Dict],
+    token_budget: int = INSIGHTS_TOKEN_BUDGET,
+) -> Tuple[str, PromptStats]:
+    """Compact insights prompt whose data section fits in token_budget"""
+    subjects = sorted(
+        (
+            {
+                "name": s.get("name"),
+                "compliance": s.get("compliance"),
+                "status": s.get("status"),
+                "pending": [{f: c.get(f) for f in COMPONENT_FIELDS} for c in s.get("pending_components", [])],
+            }
+            for s in subjects_summary
+        ),
+        key=lambda s: s["compliance"] if s["compliance"] is not None else 0
+    )
+    # Subjects get first claim on the budget (capped at half), tasks the rest
+    kept_subjects, used = _fit(subjects, token_budget // 2)
+    kept_tasks, _ = _fit([project_task(t) for t in rank_tasks(tasks)], token_budget - used)
+
+    prompt = INSIGHTS_TEMPLATE.format(subjects=_compact(kept_subjects), tasks=_compact(kept_tasks))
+    stats = PromptStats(
+        tokens=count_tokens(prompt),
+        subjects_included=len(kept_subjects),
+        subjects_total=len(subjects),
+        tasks_included=len(kept_tasks),
+        tasks_total=len(tasks),
+    )
+    logger.info(
+        f"Insights prompt: {stats.tokens} tokens, "
+        f"{stats.subjects_included}/{stats.subjects_total} subjects, {stats.tasks_included}/{stats.tasks_total} tasks"
+    )
+    return prompt, stats
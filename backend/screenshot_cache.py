@@ -0,0 +1,107 @@
+"""
+Content-addressed cache for screenshot analysis results
+
+Results are stored in Mongo under the SHA-256 of the uploaded bytes. A
+64-bit difference hash (dHash) of the image, split into 8-bit bands, lets
+re-encoded or slightly cropped re-uploads of the same portal screenshot hit
+the cache too. Entries expire through a TTL index and the collection is
+kept under a maximum size by evicting the least recently hit entries.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from PIL import Image
+
+from database import screenshot_cache_collection
+from models import ScreenshotAnalysisResult
+
+CACHE_TTL_SECONDS = int(os.environ.get('SCREENSHOT_CACHE_TTL', 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('SCREENSHOT_CACHE_MAX_ENTRIES', 10000))
+# Max differing bits between two dHashes to treat images as the same screenshot
+NEAR_DUPLICATE_DISTANCE = int(os.environ.get('SCREENSHOT_CACHE_NEAR_DISTANCE', 5))
+NEAR_DUPLICATE_CANDIDATES = 100
+
+# Per-process counters, exposed by GET /analysis/cache/stats
+stats = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def cache_stats() -> dict:
+    lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+    hit_rate = (stats["hits"] + stats["near_hits"]) / lookups if lookups else 0
+    return {**stats, "hit_rate": round(hit_rate, 4)}
+
+
+def difference_hash(image: Image.Image) -> int:
+    """64-bit dHash: compares horizontally adjacent pixels of a 9x8 grayscale thumbnail"""
+    pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def _bands(phash: int):
+    return [f"{i}:{(phash >> (8 * i)) & 0xFF:02x}" for i in range(8)]
+
+
+def _distance(stored_phash: str, phash: int) -> int:
+    return bin(int(stored_phash, 16) ^ phash).count("1")
+
+
+async def lookup_exact(sha256: str) -> Optional[ScreenshotAnalysisResult]:
+    """Cached result for byte-identical uploads; needs no image decoding"""
+    entry = await screenshot_cache_collection.find_one_and_update(
+        {"id": sha256},
+        {"$set": {"last_hit_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+        projection={"_id": 0, "result": 1}
+    )
+    if entry:
+        stats["hits"] += 1
+        return ScreenshotAnalysisResult(**entry["result"])
+    return None
+
+
+async def lookup_similar(phash: int) -> Optional[ScreenshotAnalysisResult]:
+    """Cached result for a near-identical screenshot; counts a miss otherwise"""
+    candidates = await screenshot_cache_collection.find(
+        {"bands": {"$in": _bands(phash)}},
+        {"_id": 0, "id": 1, "phash": 1, "result": 1}
+    ).limit(NEAR_DUPLICATE_CANDIDATES).to_list(NEAR_DUPLICATE_CANDIDATES)
+    best = min(candidates, key=lambda c: _distance(c["phash"], phash), default=None)
+    if best and _distance(best["phash"], phash) <= NEAR_DUPLICATE_DISTANCE:
+        await screenshot_cache_collection.update_one(
+            {"id": best["id"]}, {"$set": {"last_hit_at": datetime.utcnow()}, "$inc": {"hits": 1}}
+        )
+        stats["near_hits"] += 1
+        return ScreenshotAnalysisResult(**best["result"])
+
+    stats["misses"] += 1
+    return None
+
+
+async def store(sha256: str, phash: Optional[int], result: ScreenshotAnalysisResult):
+    """Cache a successful analysis and evict the least recently hit overflow"""
+    if not result.subjects:
+        return  # fallback / unparseable responses are not worth caching
+
+    now = datetime.utcnow()
+    document = {
+        "id": sha256,
+        "result": result.dict(),
+        "created_at": now,
+        "last_hit_at": now,
+        "hits": 0,
+    }
+    if phash is not None:
+        document["phash"] = f"{phash:016x}"
+        document["bands"] = _bands(phash)
+    await screenshot_cache_collection.replace_one({"id": sha256}, document, upsert=True)
+    stats["stores"] += 1
+
+    overflow = await screenshot_cache_collection.estimated_document_count() - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale = await screenshot_cache_collection.find({}, {"_id": 1}).sort("last_hit_at", 1).limit(overflow).to_list(overflow)
+        deleted = await screenshot_cache_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+        stats["evictions"] += deleted.deleted_count
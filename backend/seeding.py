@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Idempotent, bulk seeding of reference data
+
+Documents are written with bulk_write upserts keyed on their id, so seeding
+twice (or from two replicas at once) never duplicates anything. Startup
+seeding goes through seed_once(), which records the data version it
+applied in a seed_state document and uses that same document as a lease:
+every worker boot costs one read once the data is in place, only one
+worker does the writing when a fresh deployment scales out, and a lease
+left behind by a crashed worker expires after SEED_LOCK_TTL seconds.
+
+Fixture files are JSON Lines, one document per line, named after the
+collection they fill (challenges.jsonl, badges.jsonl,
+challenge_tests.jsonl, optionally gzipped). They are streamed and written
+in batches, so files with thousands of challenges load in constant memory.
+By default existing documents are left alone, which keeps live counters
+such as Challenge.submissions intact; --update overwrites the fields each
+line sets.
+
+Usage:
+    python seeding.py fixtures/challenges.jsonl [fixtures/badges.jsonl.gz ...]
+        [--batch-size 1000] [--update]
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Type
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import badges_collection, challenge_tests_collection, challenges_collection, \
+    seed_state_collection
+from models import Badge, Challenge, ChallengeTests
+
+logger = logging.getLogger(__name__)
+
+SEED_LOCK_TTL_SECONDS = int(os.environ.get('SEED_LOCK_TTL', 300))
+SEED_FIXTURES_DIR = os.environ.get('SEED_FIXTURES_DIR', '')
+SEED_BATCH_SIZE = 1000
+
+FIXTURE_SUFFIXES = (".jsonl", ".jsonl.gz")
+
+
+class Fixture(NamedTuple):
+    collection: object
+    model: Type[BaseModel]
+    key: str
+
+
+# Fixture file name (without suffix) -> where and how its documents go
+FIXTURES: Dict[str, Fixture] = {
+    "challenges": Fixture(challenges_collection, Challenge, "id"),
+    "badges": Fixture(badges_collection, Badge, "id"),
+    "challenge_tests": Fixture(challenge_tests_collection, ChallengeTests, "challenge_id"),
+}
+
+
+def _upsert(doc: dict, key: str, fields: Iterable[str] = ()) -> UpdateOne:
+    """Insert doc if its key is new; `fields` are overwritten on an existing document too"""
+    update = {}
+    overwrite = {field: doc[field] for field in fields if field != key and field in doc}
+    if overwrite:
+        update["$set"] = overwrite
+    inserted = {field: value for field, value in doc.items() if field not in overwrite}
+    if inserted:
+        update["$setOnInsert"] = inserted
+    return UpdateOne({key: doc[key]}, update, upsert=True)
+
+
+async def upsert_many(collection, docs: List[dict], key: str = "id", fields: Iterable[str] = ()) -> int:
+    """Insert the documents that don't exist yet in one round trip; returns how many were new
+
+    `fields` are overwritten on documents that already exist, everything else
+    (e.g. live counters) is only written on insert.
+    """
+    if not docs:
+        return 0
+    result = await collection.bulk_write([_upsert(doc, key, fields) for doc in docs], ordered=False)
+    return result.upserted_count
+
+
+async def remove_duplicates(collection, key: str = "id") -> int:
+    """Drop all but the oldest document per key; returns the number removed
+
+    Older per-boot seeding could insert the same challenges and badges once
+    per worker, which also kept the unique id indexes from being created.
+    """
+    pipeline = [
+        {"$group": {"_id": f"${key}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    extra = []
+    async for group in collection.aggregate(pipeline):
+        extra.extend(sorted(group["ids"])[1:])
+    if not extra:
+        return 0
+    result = await collection.delete_many({"_id": {"$in": extra}})
+    logger.warning(f"Removed {result.deleted_count} duplicate documents from '{collection.name}'")
+    return result.deleted_count
+
+
+async def _acquire(name: str, version: str, owner: str) -> bool:
+    """Take the seeding lease unless `version` is already seeded or another worker holds it"""
+    now = datetime.utcnow()
+    try:
+        # No match either means the lease is held or the version is done; the
+        # upsert then collides with the existing _id and the lease is not ours
+        await seed_state_collection.update_one(
+            {
+                "_id": name,
+                "version": {"$ne": version},
+                "$or": [{"lock_expires_at": None}, {"lock_expires_at": {"$lt": now}}],
+            },
+            {"$set": {
+                "lock_owner": owner,
+                "lock_expires_at": now + timedelta(seconds=SEED_LOCK_TTL_SECONDS),
+            }},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def seed_once(name: str, version: str, seed: Callable[[], Awaitable[None]]) -> bool:
+    """Run seed() on one worker for each new data version; returns whether this worker ran it"""
+    if await seed_state_collection.find_one({"_id": name, "version": version}, {"_id": 1}):
+        return False
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    if not await _acquire(name, version, owner):
+        logger.info(f"Seeding '{name}' is done or in progress elsewhere; skipping")
+        return False
+
+    done = {}
+    try:
+        await seed()
+        done = {"version": version, "seeded_at": datetime.utcnow(), "seeded_by": owner}
+    finally:
+        # Release even when seeding failed, so another worker can retry
+        await seed_state_collection.update_one(
+            {"_id": name, "lock_owner": owner},
+            {"$set": {"lock_owner": None, "lock_expires_at": None, **done}}
+        )
+    return True
+
+
+def fixture_files(directory: str) -> List[Path]:
+    """Fixture files in a directory, in the order FIXTURES lists their collections"""
+    if not directory:
+        return []
+    paths = [path for path in Path(directory).iterdir() if path.name.endswith(FIXTURE_SUFFIXES)]
+    order = list(FIXTURES)
+    return sorted(
+        (path for path in paths if _fixture_name(path) in FIXTURES),
+        key=lambda path: (order.index(_fixture_name(path)), path.name)
+    )
+
+
+def fixtures_version(paths: List[Path]) -> str:
+    """Changes whenever a fixture file is added, removed or rewritten"""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _fixture_name(path: Path) -> str:
+    for suffix in FIXTURE_SUFFIXES:
+        if path.name.endswith(suffix):
+            return path.name[:-len(suffix)]
+    return path.stem
+
+
+def _read_lines(path: Path) -> Iterator[str]:
+    opener = gzip.open if path.name.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as lines:
+        yield from lines
+
+
+async def load_fixture(path: Path, batch_size: int = SEED_BATCH_SIZE, update: bool = False) -> int:
+    """Stream one JSON Lines fixture into its collection; returns the number of documents read"""
+    name = _fixture_name(path)
+    if name not in FIXTURES:
+        raise ValueError(f"Unknown fixture '{path.name}', expected one of {', '.join(FIXTURES)}")
+    fixture = FIXTURES[name]
+
+    read = inserted = 0
+    batch: List[UpdateOne] = []
+
+    async def flush():
+        nonlocal inserted, batch
+        if batch:
+            result = await fixture.collection.bulk_write(batch, ordered=False)
+            inserted += result.upserted_count
+            batch = []
+
+    for line_number, line in enumerate(_read_lines(path), 1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+            if fixture.key not in raw:
+                # A generated id would make every reload insert the document again
+                raise ValueError(f"missing '{fixture.key}'")
+            doc = fixture.model(**raw).dict()
+        except ValueError as e:
+            raise ValueError(f"{path.name}:{line_number}: {e}") from e
+        batch.append(_upsert(doc, fixture.key, raw.keys() if update else ()))
+        read += 1
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+
+    logger.info(f"Fixture {path.name}: {read} documents, {inserted} new")
+    return read
+
+
+async def main(paths: List[str], batch_size: int, update: bool):
+    total = 0
+    for path in paths:
+        total += await load_fixture(Path(path), batch_size, update)
+    print(f"✅ Fixtures loaded, {total} documents from {len(paths)} files")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="JSON Lines fixture files named after their collection")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    parser.add_argument("--update", action="store_true", help="overwrite the fields each line sets")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(args.paths, args.batch_size, args.update))
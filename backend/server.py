@@ -1,17 +1,41 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Query, Header
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
+import math
 from pathlib import Path
-from typing import List, Optional
-import base64
+from typing import List, Literal, Optional
 from datetime import datetime, timedelta
+from functools import partial
+import numpy as np
+from cachetools import TTLCache
+from pymongo import ReturnDocument, UpdateOne
 
 # Import models and services
 from models import *
 from database import *
-from ai_services import analyze_screenshot, generate_tactical_insights, generate_coding_mentor_feedback
+from ai_services import analyze_screenshot, generate_tactical_insights
+from indexes import ensure_indexes, verify_query_plans
+from fast_json import FastJSONResponse, dumps, response_projection
+from pagination import paginate, render_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+import screenshot_cache
+import insights_cache
+import submission_cache
+from catalog_cache import challenge_catalog, badge_catalog, respond
+import badges
+import challenge_stats
+import metrics
+import seeding
+from prompt_builder import TASK_FIELDS
+from image_pipeline import read_upload, prepare_upload
+from jobs import analysis_jobs, get_job, job_events, QueueFull
+from judge import judge, JudgeBusy
+from leaderboard import leaderboard
+from mentor_feedback import start_feedback, get_feedback, feedback_events, stop_feedback
+from grading import grade_components, simulate_scenarios, solve_targets, DEFAULT_TARGETS, STATUS_MIN_GRADE
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,95 +49,216 @@ api_router = APIRouter(prefix="/api")
 # Default user ID for demo mode
 DEFAULT_USER_ID = "demo-user-001"
 
-# Initialize sample data on startup
+# Subject documents read by the simulators; planner sliders fire bursts of
+# requests against the same subject
+SUBJECT_CACHE_TTL = int(os.environ.get('SUBJECT_CACHE_TTL', '30'))
+subject_cache = TTLCache(maxsize=1024, ttl=SUBJECT_CACHE_TTL)
+
+# Upper bound on scenarios evaluated by one batch simulation
+MAX_BATCH_SCENARIOS = 10000
+
+# Upper bound on updates applied by one bulk PATCH /tasks
+MAX_BULK_TASK_UPDATES = 1000
+
+# Background reconciliation of Challenge.submissions/success_rate
+challenge_stats_task: Optional[asyncio.Task] = None
+
+# Bump when the sample data below changes so the next deploy seeds it again
+SAMPLE_DATA_VERSION = "3"
+
+# Sample catalog fields a new data version rewrites on existing documents;
+# live counters and created_at are only written on insert
+SAMPLE_CHALLENGE_FIELDS = ("title", "difficulty", "points", "tags", "description", "test_cases", "starter_code")
+SAMPLE_BADGE_FIELDS = ("name", "icon", "rarity", "description", "criteria")
+SAMPLE_CHALLENGE_TEST_FIELDS = ("entry_point", "harness", "cases")
+
+def demo_user() -> User:
+    return User(
+        id=DEFAULT_USER_ID,
+        name="Alex Chen",
+        email="alex.chen@university.edu",
+        avatar="https://api.dicebear.com/7.x/avataaars/svg?seed=Alex",
+        level=12,
+        points=8450,
+        compliance=87,
+        streak=23
+    )
+
+SAMPLE_CHALLENGES = [
+    Challenge(
+        id="challenge-001",
+        title="Two Sum Problem",
+        difficulty=DifficultyEnum.easy,
+        points=100,
+        tags=["arrays", "hash-table"],
+        description="Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target.",
+        test_cases=3,
+        starter_code="def two_sum(nums, target):\n    # Your code here\n    pass"
+    ),
+    Challenge(
+        id="challenge-002", 
+        title="Binary Tree Traversal",
+        difficulty=DifficultyEnum.medium,
+        points=250,
+        tags=["trees", "recursion"],
+        description="Implement inorder, preorder, and postorder traversal of a binary tree.",
+        test_cases=5,
+        starter_code="class TreeNode:\n    def __init__(self, val=0, left=None, right=None):\n        self.val = val\n        self.left = left\n        self.right = right\n\ndef inorder_traversal(root):\n    # Your code here\n    pass"
+    ),
+    Challenge(
+        id="challenge-003",
+        title="Dynamic Programming: Fibonacci",
+        difficulty=DifficultyEnum.hard,
+        points=500,
+        tags=["dynamic-programming", "optimization"],
+        description="Implement an efficient solution to calculate the nth Fibonacci number using dynamic programming.",
+        test_cases=8,
+        starter_code="def fibonacci(n):\n    # Implement efficient DP solution\n    pass"
+    )
+]
+
+SAMPLE_BADGES = [
+    Badge(
+        id="badge-001",
+        name="First Steps",
+        icon="🎯",
+        rarity=RarityEnum.common,
+        description="Complete your first challenge",
+        criteria={"challenges_completed": 1}
+    ),
+    Badge(
+        id="badge-002", 
+        name="Problem Solver",
+        icon="🧠",
+        rarity=RarityEnum.rare,
+        description="Solve 10 challenges",
+        criteria={"challenges_completed": 10}
+    ),
+    Badge(
+        id="badge-003",
+        name="Academic Excellence", 
+        icon="🏆",
+        rarity=RarityEnum.epic,
+        description="Maintain 90%+ compliance across all subjects",
+        criteria={"min_compliance": 90}
+    )
+]
+
+# Hidden test suites for the sample challenges
+SAMPLE_CHALLENGE_TESTS = [
+    ChallengeTests(
+        challenge_id="challenge-001",
+        entry_point="two_sum",
+        cases=[
+            TestCase(input=[[2, 7, 11, 15], 9], expected=[0, 1]),
+            TestCase(input=[[3, 2, 4], 6], expected=[1, 2]),
+            TestCase(input=[[3, 3], 6], expected=[0, 1]),
+        ]
+    ),
+    ChallengeTests(
+        challenge_id="challenge-002",
+        entry_point="judge_inorder",
+        # Cases give the tree in level order, None marking a missing child
+        harness=(
+            "def judge_inorder(values):\n"
+            "    nodes = [TreeNode(v) if v is not None else None for v in values]\n"
+            "    children = iter(nodes[1:])\n"
+            "    for node in nodes:\n"
+            "        if node:\n"
+            "            node.left = next(children, None)\n"
+            "            node.right = next(children, None)\n"
+            "    return inorder_traversal(nodes[0] if nodes else None)\n"
+        ),
+        cases=[
+            TestCase(input=[[1, None, 2, 3]], expected=[1, 3, 2]),
+            TestCase(input=[[]], expected=[]),
+            TestCase(input=[[1]], expected=[1]),
+            TestCase(input=[[1, 2, 3, 4, 5]], expected=[4, 2, 5, 1, 3]),
+            TestCase(input=[[3, 1, 4, None, 2]], expected=[1, 2, 3, 4]),
+        ]
+    ),
+    ChallengeTests(
+        challenge_id="challenge-003",
+        entry_point="fibonacci",
+        cases=[
+            TestCase(input=[n], expected=expected)
+            for n, expected in [
+                (0, 0), (1, 1), (2, 1), (10, 55), (20, 6765),
+                (30, 832040), (50, 12586269025), (90, 2880067194370816120)
+            ]
+        ]
+    ),
+]
+
+# Create indexes before any other startup work touches the collections
+@app.on_event("startup")
+async def bootstrap_indexes():
+    """Ensure indexes exist and optionally verify query plans"""
+    await ensure_indexes()
+    if os.environ.get('VERIFY_QUERY_PLANS', 'false').lower() == 'true':
+        # Raises CollectionScanError and aborts startup on a COLLSCAN
+        await verify_query_plans()
+
+@app.on_event("startup")
+async def start_analysis_workers():
+    """Start the background screenshot analysis workers"""
+    analysis_jobs.start()
+
+@app.on_event("startup")
+async def start_judge():
+    """Pre-fork the sandboxed test runners"""
+    await judge.start()
+
+@app.on_event("startup")
+async def start_challenge_stats_reconciliation():
+    """Periodically repair drift in the challenge submission counters"""
+    global challenge_stats_task
+    if challenge_stats.RECONCILE_INTERVAL_SECONDS > 0:
+        challenge_stats_task = asyncio.create_task(challenge_stats.reconcile_periodically())
+
+# Seed demo data once per data version, on a single worker
 @app.on_event("startup")
 async def initialize_sample_data():
-    """Initialize sample data for demo"""
+    """Upsert the demo user, sample catalog and any fixture files"""
     try:
-        # Check if sample data already exists
-        existing_user = await users_collection.find_one({"id": DEFAULT_USER_ID})
-        if existing_user:
-            return  # Data already initialized
-        
-        # Create sample challenges
-        sample_challenges = [
-            Challenge(
-                id="challenge-001",
-                title="Two Sum Problem",
-                difficulty=DifficultyEnum.easy,
-                points=100,
-                submissions=1247,
-                success_rate=0.73,
-                tags=["arrays", "hash-table"],
-                description="Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target.",
-                test_cases=3,
-                starter_code="def two_sum(nums, target):\n    # Your code here\n    pass"
-            ),
-            Challenge(
-                id="challenge-002", 
-                title="Binary Tree Traversal",
-                difficulty=DifficultyEnum.medium,
-                points=250,
-                submissions=892,
-                success_rate=0.58,
-                tags=["trees", "recursion"],
-                description="Implement inorder, preorder, and postorder traversal of a binary tree.",
-                test_cases=5,
-                starter_code="class TreeNode:\n    def __init__(self, val=0, left=None, right=None):\n        self.val = val\n        self.left = left\n        self.right = right\n\ndef inorder_traversal(root):\n    # Your code here\n    pass"
-            ),
-            Challenge(
-                id="challenge-003",
-                title="Dynamic Programming: Fibonacci",
-                difficulty=DifficultyEnum.hard,
-                points=500,
-                submissions=456,
-                success_rate=0.34,
-                tags=["dynamic-programming", "optimization"],
-                description="Implement an efficient solution to calculate the nth Fibonacci number using dynamic programming.",
-                test_cases=8,
-                starter_code="def fibonacci(n):\n    # Implement efficient DP solution\n    pass"
-            )
-        ]
-        
-        for challenge in sample_challenges:
-            await challenges_collection.insert_one(challenge.dict())
-        
-        # Create sample badges
-        sample_badges = [
-            Badge(
-                id="badge-001",
-                name="First Steps",
-                icon="🎯",
-                rarity=RarityEnum.common,
-                description="Complete your first challenge",
-                criteria={"challenges_completed": 1}
-            ),
-            Badge(
-                id="badge-002", 
-                name="Problem Solver",
-                icon="🧠",
-                rarity=RarityEnum.rare,
-                description="Solve 10 challenges",
-                criteria={"challenges_completed": 10}
-            ),
-            Badge(
-                id="badge-003",
-                name="Academic Excellence", 
-                icon="🏆",
-                rarity=RarityEnum.epic,
-                description="Maintain 90%+ compliance across all subjects",
-                criteria={"min_compliance": 90}
-            )
-        ]
-        
-        for badge in sample_badges:
-            await badges_collection.insert_one(badge.dict())
-            
-        print("✅ Sample data initialized successfully")
-        
+        fixtures = seeding.fixture_files(seeding.SEED_FIXTURES_DIR)
+        version = f"{SAMPLE_DATA_VERSION}:{seeding.fixtures_version(fixtures)}"
+        if await seeding.seed_once("sample_data", version, partial(seed_sample_data, fixtures)):
+            print("✅ Sample data initialized successfully")
     except Exception as e:
         print(f"❌ Error initializing sample data: {e}")
 
+# After seeding, so a fresh database ranks the demo user
+@app.on_event("startup")
+async def start_leaderboard():
+    """Load the materialized leaderboard and keep it in sync"""
+    await leaderboard.start()
+
+async def seed_sample_data(fixtures):
+    """Write the sample data with bulk upserts, then stream in fixture files"""
+    removed = 0
+    for collection in (users_collection, challenges_collection, badges_collection):
+        removed += await seeding.remove_duplicates(collection)
+    if removed:
+        # The unique id indexes could not be built over the duplicates
+        await ensure_indexes()
+
+    await seeding.upsert_many(users_collection, [demo_user().dict()])
+    await seeding.upsert_many(
+        challenges_collection, [challenge.dict() for challenge in SAMPLE_CHALLENGES], fields=SAMPLE_CHALLENGE_FIELDS
+    )
+    await seeding.upsert_many(badges_collection, [badge.dict() for badge in SAMPLE_BADGES], fields=SAMPLE_BADGE_FIELDS)
+    await seeding.upsert_many(
+        challenge_tests_collection, [tests.dict() for tests in SAMPLE_CHALLENGE_TESTS], key="challenge_id",
+        fields=SAMPLE_CHALLENGE_TEST_FIELDS
+    )
+    for path in fixtures:
+        await seeding.load_fixture(path)
+
+    challenge_catalog.invalidate()
+    badge_catalog.invalidate()
+    badges.invalidate_rules()
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -126,73 +271,78 @@ async def get_current_user():
     """Get current user profile"""
     user = await users_collection.find_one({"id": DEFAULT_USER_ID})
     if not user:
-        # Create default user
-        default_user = User(
-            id=DEFAULT_USER_ID,
-            name="Alex Chen",
-            email="alex.chen@university.edu",
-            avatar="https://api.dicebear.com/7.x/avataaars/svg?seed=Alex",
-            level=12,
-            points=8450,
-            compliance=87,
-            streak=23
-        )
-        await users_collection.insert_one(default_user.dict())
+        # Seeding normally creates it; upsert in case this request raced it
+        default_user = demo_user()
+        await seeding.upsert_many(users_collection, [default_user.dict()])
         return default_user
     return User(**user)
 
 @api_router.get("/users/{user_id}/stats", response_model=UserStats)
 async def get_user_stats(user_id: str = DEFAULT_USER_ID):
     """Get user statistics"""
-    total_subjects = await subjects_collection.count_documents({"user_id": user_id})
-    total_tasks = await tasks_collection.count_documents({"user_id": user_id})
-    completed_tasks = await tasks_collection.count_documents({"user_id": user_id, "completed": True})
-    badges_earned = await user_badges_collection.count_documents({"user_id": user_id, "earned": True})
-    
-    # Calculate average compliance
-    subjects = await subjects_collection.find({"user_id": user_id}).to_list(100)
-    avg_compliance = sum(s.get("compliance", 0) for s in subjects) / len(subjects) if subjects else 0
+    # Single round trip: union the user's subjects, tasks and earned badges
+    # into one stream and fold it with a single $group
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$project": {"_id": 0, "kind": {"$literal": "subject"}, "compliance": {"$ifNull": ["$compliance", 0]}}},
+        {"$unionWith": {
+            "coll": "tasks",
+            "pipeline": [
+                {"$match": {"user_id": user_id}},
+                {"$project": {"_id": 0, "kind": {"$literal": "task"}, "completed": 1}}
+            ]
+        }},
+        {"$unionWith": {
+            "coll": "user_badges",
+            "pipeline": [
+                {"$match": {"user_id": user_id, "earned": True}},
+                {"$project": {"_id": 0, "kind": {"$literal": "badge"}}}
+            ]
+        }},
+        {"$group": {
+            "_id": None,
+            "total_subjects": {"$sum": {"$cond": [{"$eq": ["$kind", "subject"]}, 1, 0]}},
+            "total_tasks": {"$sum": {"$cond": [{"$eq": ["$kind", "task"]}, 1, 0]}},
+            "completed_tasks": {"$sum": {"$cond": [
+                {"$and": [{"$eq": ["$kind", "task"]}, {"$eq": ["$completed", True]}]}, 1, 0
+            ]}},
+            "badges_earned": {"$sum": {"$cond": [{"$eq": ["$kind", "badge"]}, 1, 0]}},
+            # $avg skips the nulls produced for non-subject rows
+            "average_compliance": {"$avg": {"$cond": [{"$eq": ["$kind", "subject"]}, "$compliance", None]}}
+        }}
+    ]
+    result = await subjects_collection.aggregate(pipeline).to_list(1)
+    stats = result[0] if result else {}
     
     return UserStats(
-        total_subjects=total_subjects,
-        total_tasks=total_tasks,
-        completed_tasks=completed_tasks,
-        badges_earned=badges_earned,
-        average_compliance=round(avg_compliance, 2)
+        total_subjects=stats.get("total_subjects", 0),
+        total_tasks=stats.get("total_tasks", 0),
+        completed_tasks=stats.get("completed_tasks", 0),
+        badges_earned=stats.get("badges_earned", 0),
+        average_compliance=round(stats.get("average_compliance") or 0, 2)
     )
 
 # ==================== SUBJECT ENDPOINTS ====================
 
 @api_router.get("/subjects", response_model=List[Subject])
-async def get_subjects(user_id: str = DEFAULT_USER_ID):
+async def get_subjects(
+    user_id: str = DEFAULT_USER_ID,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
     """List all subjects for user"""
-    subjects = await subjects_collection.find({"user_id": user_id}).to_list(100)
-    return [Subject(**s) for s in subjects]
+    return await paginate(
+        subjects_collection, {"user_id": user_id}, Subject, after, limit, fields,
+        sort=[("created_at", 1), ("id", 1)]
+    )
 
 @api_router.post("/subjects", response_model=Subject)
 async def create_subject(subject_data: SubjectCreate, user_id: str = DEFAULT_USER_ID):
     """Create new subject"""
-    # Calculate current marks and compliance
-    total_weighted = 0
-    total_weight = 0
-    for comp in subject_data.components:
-        if not comp.pending:
-            total_weighted += (comp.scored / comp.total) * comp.weight
-            total_weight += comp.weight
-    
-    current_marks = (total_weighted / total_weight * 100) if total_weight > 0 else 0
+    current_marks, status = grade_components(subject_data.components)
     compliance = current_marks
     
-    # Determine status
-    if compliance >= 90:
-        status = StatusEnum.excellent
-    elif compliance >= 85:
-        status = StatusEnum.on_track
-    elif compliance >= 75:
-        status = StatusEnum.at_risk
-    else:
-        status = StatusEnum.critical
-    
     subject = Subject(
         user_id=user_id,
         name=subject_data.name,
@@ -205,37 +355,27 @@ async def create_subject(subject_data: SubjectCreate, user_id: str = DEFAULT_USE
     )
     
     await subjects_collection.insert_one(subject.dict())
+    insights_cache.invalidate(user_id)
+    await badges.on_metric_changed(user_id, badges.MIN_COMPLIANCE)
     return subject
 
+async def get_subject_cached(subject_id: str) -> Subject:
+    """Read a subject through the short-lived simulation cache"""
+    subject_obj = subject_cache.get(subject_id)
+    if subject_obj is None:
+        subject = await subjects_collection.find_one({"id": subject_id}, {"_id": 0})
+        if not subject:
+            raise HTTPException(status_code=404, detail="Subject not found")
+        subject_obj = subject_cache[subject_id] = Subject(**subject)
+    return subject_obj
+
 @api_router.post("/subjects/{subject_id}/simulate", response_model=SimulationResponse)
 async def simulate_grade(subject_id: str, simulation: SimulationRequest):
     """Simulate final grade with what-if scores"""
-    subject = await subjects_collection.find_one({"id": subject_id})
-    if not subject:
-        raise HTTPException(status_code=404, detail="Subject not found")
-    
-    subject_obj = Subject(**subject)
-    
-    # Calculate with simulated scores
-    total_weighted = 0
-    total_weight = 0
-    
-    for comp in subject_obj.components:
-        score = simulation.simulated_scores.get(comp.name, comp.scored)
-        total_weighted += (score / comp.total) * comp.weight
-        total_weight += comp.weight
+    subject_obj = await get_subject_cached(subject_id)
     
-    predicted_grade = (total_weighted / total_weight * 100) if total_weight > 0 else 0
-    
-    # Determine status
-    if predicted_grade >= 90:
-        status = StatusEnum.excellent
-    elif predicted_grade >= 85:
-        status = StatusEnum.on_track
-    elif predicted_grade >= 75:
-        status = StatusEnum.at_risk
-    else:
-        status = StatusEnum.critical
+    grades, statuses = simulate_scenarios(subject_obj.components, [simulation.simulated_scores])
+    predicted_grade, status = float(grades[0]), statuses[0]
     
     return SimulationResponse(
         predicted_grade=round(predicted_grade, 2),
@@ -243,69 +383,217 @@ async def simulate_grade(subject_id: str, simulation: SimulationRequest):
         status=status
     )
 
+@api_router.post("/subjects/{subject_id}/simulate/batch", response_model=BatchSimulationResponse)
+async def simulate_grade_batch(subject_id: str, simulation: BatchSimulationRequest):
+    """Simulate many what-if scenarios for one subject in a single matrix operation"""
+    subject_obj = await get_subject_cached(subject_id)
+    component_names = {comp.name for comp in subject_obj.components}
+    
+    scenarios = list(simulation.scenarios)
+    if simulation.grid:
+        grid_names = [name for name in simulation.grid if name in component_names]
+        grid_size = math.prod(len(simulation.grid[name]) for name in grid_names) if grid_names else 0
+        if len(scenarios) + grid_size > MAX_BATCH_SCENARIOS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SCENARIOS} scenarios per batch")
+        if grid_size:
+            axes = np.meshgrid(*[np.asarray(simulation.grid[name], dtype=float) for name in grid_names], indexing="ij")
+            points = np.stack(axes, axis=-1).reshape(-1, len(grid_names))
+            scenarios.extend(dict(zip(grid_names, row)) for row in points.tolist())
+    if len(scenarios) > MAX_BATCH_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SCENARIOS} scenarios per batch")
+    
+    grades, statuses = simulate_scenarios(subject_obj.components, scenarios)
+    
+    return BatchSimulationResponse(
+        scenarios=scenarios,
+        predicted_grades=np.round(grades, 2).tolist(),
+        statuses=statuses
+    )
+
+def _check_targets(targets: List[StatusEnum]):
+    unsupported = [t.value for t in targets if t not in STATUS_MIN_GRADE]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Unsupported target status: {', '.join(unsupported)}")
+
+@api_router.get("/subjects/{subject_id}/targets", response_model=SubjectTargets)
+async def get_subject_targets(subject_id: str, targets: List[StatusEnum] = Query(list(DEFAULT_TARGETS))):
+    """Minimum scores on pending components needed to reach each target status"""
+    _check_targets(targets)
+    subject_obj = await get_subject_cached(subject_id)
+    
+    current, requirements = solve_targets([subject_obj.components], targets)
+    return SubjectTargets(
+        subject_id=subject_obj.id,
+        subject_name=subject_obj.name,
+        current_grade=round(float(current[0]), 2),
+        requirements=requirements[0]
+    )
+
+@api_router.get("/users/{user_id}/targets", response_model=List[SubjectTargets])
+async def get_user_targets(user_id: str = DEFAULT_USER_ID, targets: List[StatusEnum] = Query(list(DEFAULT_TARGETS))):
+    """Solve target requirements for all of a user's subjects in one bulk call"""
+    _check_targets(targets)
+    subjects = await subjects_collection.find(
+        {"user_id": user_id}, {"_id": 0, "id": 1, "name": 1, "components": 1}
+    ).to_list(None)
+    
+    current, requirements = solve_targets([s.get("components", []) for s in subjects], targets)
+    return [
+        SubjectTargets(
+            subject_id=subject["id"],
+            subject_name=subject["name"],
+            current_grade=round(float(grade), 2),
+            requirements=subject_requirements
+        )
+        for subject, grade, subject_requirements in zip(subjects, current, requirements)
+    ]
+
 # ==================== SCREENSHOT ANALYSIS ENDPOINT ====================
 
 @api_router.post("/analysis/screenshot")
-async def analyze_screenshot_endpoint(file: UploadFile = File(...)):
-    """Upload and analyze marks screenshot"""
+async def analyze_screenshot_endpoint(file: UploadFile = File(...), mode: Literal["sync", "async"] = "sync"):
+    """Upload and analyze marks screenshot (mode=async returns a job id immediately)"""
     try:
-        # Read file and convert to base64
-        contents = await file.read()
-        image_base64 = base64.b64encode(contents).decode('utf-8')
+        # Size-capped, chunked read; byte-identical re-uploads skip decoding
+        upload = await read_upload(file)
+        cached = await screenshot_cache.lookup_exact(upload.sha256)
+        if not cached:
+            # Decode, downscale and re-encode off the event loop
+            prepared = await prepare_upload(upload)
+            cached = await screenshot_cache.lookup_similar(prepared.phash)
+        if cached:
+            if mode == "async":
+                return {"job_id": None, "status": "succeeded", "result": cached.dict()}
+            return cached.dict()
+        
+        if mode == "async":
+            try:
+                job_id = await analysis_jobs.submit(upload.sha256, prepared.phash, prepared.image_base64)
+            except QueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status_url": f"/api/analysis/jobs/{job_id}",
+                "events_url": f"/api/analysis/jobs/{job_id}/events"
+            })
         
         # Analyze with AI
-        result = await analyze_screenshot(image_base64)
+        result = await analyze_screenshot(prepared.image_base64)
         
+        await screenshot_cache.store(upload.sha256, prepared.phash, result)
         return result.dict()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@api_router.get("/analysis/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Status and result of an async screenshot analysis"""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/analysis/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """Server-sent events for an async screenshot analysis until it completes"""
+    job = await get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/analysis/cache/stats")
+async def get_screenshot_cache_stats():
+    """Screenshot analysis cache counters for this worker"""
+    return screenshot_cache.cache_stats()
+
 # ==================== TASK ENDPOINTS ====================
 
 @api_router.get("/tasks", response_model=List[Task])
-async def get_tasks(user_id: str = DEFAULT_USER_ID):
+async def get_tasks(
+    user_id: str = DEFAULT_USER_ID,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
     """List all tasks"""
-    tasks = await tasks_collection.find({"user_id": user_id}).to_list(100)
-    return [Task(**t) for t in tasks]
+    return await paginate(
+        tasks_collection, {"user_id": user_id}, Task, after, limit, fields,
+        sort=[("created_at", 1), ("id", 1)]
+    )
 
 @api_router.post("/tasks", response_model=Task)
 async def create_task(task_data: TaskCreate, user_id: str = DEFAULT_USER_ID):
     """Create new task"""
     task = Task(user_id=user_id, **task_data.dict())
     await tasks_collection.insert_one(task.dict())
+    insights_cache.invalidate(user_id)
     return task
 
 @api_router.put("/tasks/{task_id}", response_model=Task)
 async def update_task(task_id: str, task_update: TaskUpdate):
     """Update task"""
-    task = await tasks_collection.find_one({"id": task_id})
+    update_data = {k: v for k, v in task_update.dict().items() if v is not None}
+    if update_data:
+        task = await tasks_collection.find_one_and_update(
+            {"id": task_id}, {"$set": update_data},
+            projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    else:
+        task = await tasks_collection.find_one({"id": task_id}, {"_id": 0})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    update_data = {k: v for k, v in task_update.dict().items() if v is not None}
-    await tasks_collection.update_one({"id": task_id}, {"$set": update_data})
+    if update_data:
+        insights_cache.invalidate(task["user_id"])
+    return Task(**task)
+
+@api_router.patch("/tasks", response_model=BulkTaskUpdateResponse)
+async def bulk_update_tasks(patches: List[TaskPatch], user_id: str = DEFAULT_USER_ID):
+    """Apply many task updates in one round trip"""
+    if len(patches) > MAX_BULK_TASK_UPDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TASK_UPDATES} updates per request")
+    
+    operations = []
+    for patch in patches:
+        update_data = {k: v for k, v in patch.dict(exclude={"id"}).items() if v is not None}
+        if update_data:
+            operations.append(UpdateOne({"id": patch.id, "user_id": user_id}, {"$set": update_data}))
+    if not operations:
+        return BulkTaskUpdateResponse(matched=0, modified=0)
     
-    updated_task = await tasks_collection.find_one({"id": task_id})
-    return Task(**updated_task)
+    result = await tasks_collection.bulk_write(operations, ordered=False)
+    insights_cache.invalidate(user_id)
+    return BulkTaskUpdateResponse(matched=result.matched_count, modified=result.modified_count)
 
 @api_router.post("/tasks/{task_id}/toggle")
 async def toggle_task(task_id: str):
     """Toggle task completion"""
-    task = await tasks_collection.find_one({"id": task_id})
+    # Flipped server-side, so concurrent toggles can't both read the old value
+    task = await tasks_collection.find_one_and_update(
+        {"id": task_id},
+        [{"$set": {"completed": {"$not": {"$ifNull": ["$completed", False]}}}}],
+        projection={"_id": 0, "user_id": 1, "completed": 1},
+        return_document=ReturnDocument.AFTER
+    )
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    insights_cache.invalidate(task["user_id"])
     
-    new_status = not task.get("completed", False)
-    await tasks_collection.update_one({"id": task_id}, {"$set": {"completed": new_status}})
-    
-    return {"success": True, "completed": new_status}
+    return {"success": True, "completed": task["completed"]}
 
 @api_router.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
     """Delete task"""
-    result = await tasks_collection.delete_one({"id": task_id})
-    if result.deleted_count == 0:
+    task = await tasks_collection.find_one_and_delete({"id": task_id}, projection={"_id": 0, "user_id": 1})
+    if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    insights_cache.invalidate(task["user_id"])
     return {"success": True}
 
 # ==================== AI INSIGHTS ENDPOINT ====================
@@ -313,30 +601,46 @@ async def delete_task(task_id: str):
 @api_router.get("/insights/tactical", response_model=List[TacticalInsight])
 async def get_tactical_insights(user_id: str = DEFAULT_USER_ID):
     """Get AI-powered tactical insights"""
-    subjects = await subjects_collection.find({"user_id": user_id}).to_list(100)
-    tasks = await tasks_collection.find({"user_id": user_id, "completed": False}).to_list(100)
+    subjects = await subjects_collection.find(
+        {"user_id": user_id}, {"_id": 0, "name": 1, "compliance": 1, "components": 1}
+    ).to_list(100)
+    # Most urgent first, so the cap and the prompt's token budget keep the tasks that matter
+    tasks = await tasks_collection.find(
+        {"user_id": user_id, "completed": False}, {"_id": 0, "id": 1, **{f: 1 for f in TASK_FIELDS}}
+    ).sort([("urgency", -1), ("due_date", 1)]).to_list(100)
     
-    subjects_data = [s for s in subjects]
-    tasks_data = [t for t in tasks]
-    
-    insights = await generate_tactical_insights(subjects_data, tasks_data)
-    return insights
+    # Cached per fingerprint of this data; concurrent identical requests share one LLM call
+    return await insights_cache.get_or_generate(user_id, subjects, tasks, generate_tactical_insights)
 
 # ==================== CHALLENGE ENDPOINTS ====================
 
 @api_router.get("/challenges", response_model=List[Challenge])
-async def get_challenges():
+async def get_challenges(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     """List all coding challenges"""
-    challenges = await challenges_collection.find().to_list(100)
-    return [Challenge(**c) for c in challenges]
+    cached = await challenge_catalog.get(
+        ("list", after, limit, fields),
+        lambda: render_page(challenges_collection, {}, Challenge, after, limit, fields)
+    )
+    return respond(cached, if_none_match)
 
 @api_router.get("/challenges/{challenge_id}", response_model=Challenge)
-async def get_challenge(challenge_id: str):
+async def get_challenge(challenge_id: str, if_none_match: Optional[str] = Header(None)):
     """Get specific challenge details"""
-    challenge = await challenges_collection.find_one({"id": challenge_id})
-    if not challenge:
+    async def load():
+        challenge = await challenges_collection.find_one({"id": challenge_id}, response_projection(Challenge))
+        if not challenge:
+            return None
+        return dumps(challenge), {}
+    
+    cached = await challenge_catalog.get(("item", challenge_id), load)
+    if not cached:
         raise HTTPException(status_code=404, detail="Challenge not found")
-    return Challenge(**challenge)
+    return respond(cached, if_none_match)
 
 @api_router.post("/challenges/{challenge_id}/submit")
 async def submit_solution(challenge_id: str, submission_data: dict, user_id: str = DEFAULT_USER_ID):
@@ -345,12 +649,24 @@ async def submit_solution(challenge_id: str, submission_data: dict, user_id: str
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found")
     
-    # Mock test execution (in real implementation, this would run actual tests)
-    test_results = [
-        {"test_case": 1, "passed": True, "expected": "output1", "actual": "output1"},
-        {"test_case": 2, "passed": True, "expected": "output2", "actual": "output2"},
-        {"test_case": 3, "passed": False, "expected": "output3", "actual": "wrong_output"}
-    ]
+    tests = await challenge_tests_collection.find_one({"challenge_id": challenge_id}, {"_id": 0})
+    if not tests or not tests.get("cases"):
+        raise HTTPException(status_code=409, detail="Challenge has no test cases configured")
+    
+    # Duplicate programs (up to comments and layout) reuse earlier results
+    code = submission_data.get("code", "")
+    cache_key = submission_cache.cache_key(challenge_id, tests, code)
+    cached = await submission_cache.lookup(cache_key)
+    
+    if cached:
+        test_results = cached["test_results"]
+    else:
+        # Run every test case in the sandboxed judge
+        try:
+            test_results = await judge.run(code, tests["entry_point"], tests["cases"], tests.get("harness"))
+        except JudgeBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+        await submission_cache.store_results(cache_key, challenge_id, test_results)
     
     passed_tests = sum(1 for r in test_results if r["passed"])
     total_tests = len(test_results)
@@ -360,15 +676,29 @@ async def submit_solution(challenge_id: str, submission_data: dict, user_id: str
     submission = Submission(
         user_id=user_id,
         challenge_id=challenge_id,
-        code=submission_data.get("code", ""),
+        code=code,
         status=status,
         test_results=test_results
     )
     
-    await submissions_collection.insert_one(submission.dict())
+    if cached and cached.get("mentor_feedback"):
+        submission.mentor_feedback = cached["mentor_feedback"]
+        submission.feedback_status = FeedbackStatusEnum.ready
+        await submissions_collection.insert_one(submission.dict())
+    else:
+        # Mentor feedback is written in the background; the client follows it
+        # over SSE or fetches it once ready
+        submission.feedback_status = FeedbackStatusEnum.streaming
+        submission.feedback_started_at = submission.submitted_at
+        await submissions_collection.insert_one(submission.dict())
+        start_feedback(submission, on_ready=partial(submission_cache.store_feedback, cache_key))
+    
+    await challenge_stats.record_submission(challenge_id, status == "passed")
     
-    # Generate AI mentor feedback
-    feedback = await generate_coding_mentor_feedback(submission.code, test_results)
+    badges_awarded = []
+    if status == "passed":
+        leaderboard.record_solve(user_id)
+        badges_awarded = await badges.on_metric_changed(user_id, badges.CHALLENGES_COMPLETED)
     
     return {
         "submission_id": submission.id,
@@ -376,68 +706,135 @@ async def submit_solution(challenge_id: str, submission_data: dict, user_id: str
         "passed_tests": passed_tests,
         "total_tests": total_tests,
         "test_results": test_results,
-        "mentor_feedback": feedback
+        "cached": cached is not None,
+        "badges_awarded": badges_awarded,
+        "mentor_feedback": submission.mentor_feedback,
+        "feedback_status": submission.feedback_status,
+        "feedback_url": f"/api/submissions/{submission.id}/feedback",
+        "feedback_events_url": f"/api/submissions/{submission.id}/feedback/events"
     }
 
+@api_router.get("/submissions/cache/stats")
+async def get_submission_cache_stats():
+    """Submission result cache counters for this worker"""
+    return submission_cache.cache_stats()
+
+@api_router.get("/submissions/{submission_id}/feedback")
+async def get_submission_feedback(submission_id: str):
+    """Mentor feedback for a submission and whether it is ready"""
+    feedback = await get_feedback(submission_id)
+    if not feedback:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return feedback
+
+@api_router.get("/submissions/{submission_id}/feedback/events")
+async def stream_submission_feedback(submission_id: str):
+    """Server-sent events streaming mentor feedback as it is generated"""
+    feedback = await get_feedback(submission_id)
+    if not feedback:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return StreamingResponse(
+        feedback_events(feedback),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/users/{user_id}/submissions")
-async def get_user_submissions(user_id: str = DEFAULT_USER_ID):
+async def get_user_submissions(
+    user_id: str = DEFAULT_USER_ID,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
     """Get user's challenge submissions"""
-    submissions = await submissions_collection.find({"user_id": user_id}).to_list(100)
-    return [Submission(**s) for s in submissions]
+    return await paginate(
+        submissions_collection, {"user_id": user_id}, Submission, after, limit, fields,
+        sort=[("submitted_at", 1), ("id", 1)]
+    )
 
 # ==================== BADGE ENDPOINTS ====================
 
 @api_router.get("/badges", response_model=List[Badge])
-async def get_all_badges():
+async def get_all_badges(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+):
     """List all available badges"""
-    badges = await badges_collection.find().to_list(100)
-    return [Badge(**b) for b in badges]
+    cached = await badge_catalog.get(
+        ("list", after, limit, fields),
+        lambda: render_page(badges_collection, {}, Badge, after, limit, fields)
+    )
+    return respond(cached, if_none_match)
 
-@api_router.get("/users/{user_id}/badges")
+@api_router.get("/users/{user_id}/badges", response_model=List[Badge])
 async def get_user_badges(user_id: str = DEFAULT_USER_ID):
     """Get user's earned badges"""
-    user_badges = await user_badges_collection.find({"user_id": user_id, "earned": True}).to_list(100)
+    user_badges = await user_badges_collection.find(
+        {"user_id": user_id, "earned": True}, {"_id": 0, "badge_id": 1}
+    ).to_list(100)
     
     # Get badge details
     badge_ids = [ub["badge_id"] for ub in user_badges]
-    badges = await badges_collection.find({"id": {"$in": badge_ids}}).to_list(100)
+    badges = await badges_collection.find({"id": {"$in": badge_ids}}, response_projection(Badge)).to_list(100)
     
-    return [Badge(**b) for b in badges]
+    return FastJSONResponse(badges)
 
 # ==================== LEADERBOARD ENDPOINTS ====================
 
+def leaderboard_entries(ranked, user_id: str) -> List[LeaderboardEntry]:
+    return [
+        LeaderboardEntry(
+            rank=entry.rank,
+            name=entry.row.name,
+            points=entry.row.points,
+            solved=entry.row.solved,
+            avatar=entry.row.avatar,
+            is_current_user=(entry.user_id == user_id)
+        )
+        for entry in ranked
+    ]
+
+def ready_leaderboard():
+    if not leaderboard.ready:
+        raise HTTPException(status_code=503, detail="Leaderboard is loading", headers={"Retry-After": "5"})
+    return leaderboard.index
+
 @api_router.get("/leaderboard", response_model=List[LeaderboardEntry])
-async def get_leaderboard(user_id: str = DEFAULT_USER_ID):
+async def get_leaderboard(
+    user_id: str = DEFAULT_USER_ID,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+):
     """Get global leaderboard"""
-    # Get top users by points
-    users = await users_collection.find().sort("points", -1).limit(50).to_list(50)
-    
-    leaderboard = []
-    for rank, user in enumerate(users, 1):
-        # Count solved challenges
-        solved_count = await submissions_collection.count_documents({
-            "user_id": user["id"], 
-            "status": "passed"
-        })
-        
-        leaderboard.append(LeaderboardEntry(
-            rank=rank,
-            name=user["name"],
-            points=user["points"],
-            solved=solved_count,
-            avatar=user["avatar"],
-            is_current_user=(user["id"] == user_id)
-        ))
-    
-    return leaderboard
+    # Served from the worker's materialized ranking, no Mongo round trip
+    return leaderboard_entries(ready_leaderboard().page(offset, limit), user_id)
+
+@api_router.get("/users/{user_id}/rank", response_model=LeaderboardPosition)
+async def get_user_rank(user_id: str = DEFAULT_USER_ID, radius: int = Query(5, ge=0, le=50)):
+    """Get user's rank and the users ranked around them"""
+    index = ready_leaderboard()
+    return LeaderboardPosition(
+        rank=index.rank(user_id),
+        total_users=len(index),
+        entries=leaderboard_entries(index.around(user_id, radius), user_id)
+    )
 
 # ==================== LEGACY TIMELINE ENDPOINTS ====================
 
 @api_router.get("/users/{user_id}/timeline")
-async def get_user_timeline(user_id: str = DEFAULT_USER_ID):
+async def get_user_timeline(
+    user_id: str = DEFAULT_USER_ID,
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
     """Get user's academic timeline"""
-    timeline = await legacy_timeline_collection.find({"user_id": user_id}).sort("date", -1).to_list(100)
-    return [LegacyEntry(**entry) for entry in timeline]
+    return await paginate(
+        legacy_timeline_collection, {"user_id": user_id}, LegacyEntry, after, limit, fields,
+        sort=[("date", -1), ("id", -1)]
+    )
 
 @api_router.post("/users/{user_id}/timeline")
 async def add_timeline_entry(entry_data: dict, user_id: str = DEFAULT_USER_ID):
@@ -446,6 +843,14 @@ async def add_timeline_entry(entry_data: dict, user_id: str = DEFAULT_USER_ID):
     await legacy_timeline_collection.insert_one(entry.dict())
     return entry
 
+# ==================== METRICS ====================
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics for requests, Mongo and LLM calls"""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -455,8 +860,12 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Outermost, so the timings include CORS and error handling
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -464,6 +873,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("shutdown")
+async def stop_analysis_workers():
+    await analysis_jobs.stop()
+
+@app.on_event("shutdown")
+async def stop_mentor_feedback():
+    await stop_feedback()
+
+@app.on_event("shutdown")
+async def stop_judge():
+    await judge.stop()
+
+@app.on_event("shutdown")
+async def stop_challenge_stats_reconciliation():
+    if challenge_stats_task:
+        challenge_stats_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_leaderboard():
+    await leaderboard.stop()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     from database import client
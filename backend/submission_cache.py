@@ -0,0 +1,99 @@
+"""
+Result cache for challenge submissions
+
+Resubmits and pasted solutions are usually the same program up to
+comments, blank lines and trailing whitespace. Submissions are keyed on
+the challenge, its test suite and a hash of the code with those stripped,
+so a duplicate reuses the stored test results and mentor feedback instead
+of going through the judge and the LLM again. Changing a challenge's test
+suite changes every key for it, which retires the old entries.
+"""
+import hashlib
+import io
+import json
+import os
+import tokenize
+from datetime import datetime
+from typing import List, Optional
+
+from database import submission_cache_collection
+
+SUBMISSION_CACHE_TTL_SECONDS = int(os.environ.get('SUBMISSION_CACHE_TTL', 7 * 24 * 3600))
+
+# Results that depend on how busy the judge was are not worth replaying
+UNCACHEABLE_ERRORS = ("Time limit exceeded",)
+
+# Per-process counters, exposed by GET /submissions/cache/stats
+stats = {"hits": 0, "feedback_hits": 0, "misses": 0, "stores": 0}
+
+_SKIPPED_TOKENS = (tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER)
+
+
+def cache_stats() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / lookups if lookups else 0
+    return {**stats, "hit_rate": round(hit_rate, 4)}
+
+
+def normalize_code(code: str) -> str:
+    """Token stream of the code without comments, blank lines or layout whitespace"""
+    try:
+        tokens = tokenize.generate_tokens(io.StringIO(code).readline)
+        # INDENT/DEDENT/NEWLINE tokens keep the block structure that matters
+        return " ".join(
+            tokenize.tok_name[token.type] if token.type in (tokenize.INDENT, tokenize.DEDENT, tokenize.NEWLINE)
+            else token.string
+            for token in tokens
+            if token.type not in _SKIPPED_TOKENS
+        )
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Does not tokenize, so it cannot pass anyway; only exact repeats share a key
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+
+def cache_key(challenge_id: str, tests: dict, code: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(challenge_id.encode("utf-8"))
+    digest.update(json.dumps(tests, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(normalize_code(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def lookup(key: str) -> Optional[dict]:
+    """Cached test results and (once generated) mentor feedback for a key"""
+    entry = await submission_cache_collection.find_one_and_update(
+        {"id": key},
+        {"$set": {"last_hit_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+        projection={"_id": 0, "test_results": 1, "mentor_feedback": 1}
+    )
+    if not entry:
+        stats["misses"] += 1
+        return None
+    stats["hits"] += 1
+    if entry.get("mentor_feedback"):
+        stats["feedback_hits"] += 1
+    return entry
+
+
+async def store_results(key: str, challenge_id: str, test_results: List[dict]):
+    if any(result.get("error") in UNCACHEABLE_ERRORS for result in test_results):
+        return
+    now = datetime.utcnow()
+    await submission_cache_collection.update_one(
+        {"id": key},
+        {"$setOnInsert": {
+            "id": key,
+            "challenge_id": challenge_id,
+            "test_results": test_results,
+            "mentor_feedback": None,
+            "hits": 0,
+            "created_at": now,
+            "last_hit_at": now,
+        }},
+        upsert=True
+    )
+    stats["stores"] += 1
+
+
+async def store_feedback(key: str, feedback: str):
+    await submission_cache_collection.update_one({"id": key}, {"$set": {"mentor_feedback": feedback}})
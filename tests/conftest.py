@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend is a flat directory of modules, imported the way server.py imports them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# database.py needs these at import time; nothing in the unit tests connects
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "tacticalgrade_test")
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import badges
+from badges import CHALLENGES_COMPLETED, MIN_COMPLIANCE, RuleIndex
+
+BADGES = [
+    {"id": "solver", "criteria": {CHALLENGES_COMPLETED: 2}},
+    {"id": "diligent", "criteria": {MIN_COMPLIANCE: 90}},
+    {"id": "all-rounder", "criteria": {CHALLENGES_COMPLETED: 1, MIN_COMPLIANCE: 80}},
+    {"id": "unknown", "criteria": {"streak_days": 7}},
+    {"id": "empty", "criteria": {}},
+]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = AsyncMongoMockClient()["badges"]
+    for name in ("badges", "subjects", "submissions", "user_badges", "users"):
+        monkeypatch.setattr(badges, f"{name}_collection", db[name])
+    badges.invalidate_rules()
+    yield db
+    badges.invalidate_rules()
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    """Records (metric, user_ids) for every metric computation"""
+    calls = []
+
+    def spy(metric, compute):
+        async def wrapper(user_ids):
+            calls.append((metric, list(user_ids)))
+            return await compute(user_ids)
+        return wrapper
+
+    monkeypatch.setattr(badges, "METRICS", {metric: spy(metric, compute) for metric, compute in badges.METRICS.items()})
+    return calls
+
+
+async def insert(db, users=(), passed=(), compliance=()):
+    await db["badges"].insert_many([dict(badge) for badge in BADGES])
+    if users:
+        await db["users"].insert_many([{"id": user_id} for user_id in users])
+    if passed:
+        await db["submissions"].insert_many(
+            [{"user_id": user_id, "challenge_id": challenge_id, "status": "passed"} for user_id, challenge_id in passed]
+        )
+    if compliance:
+        await db["subjects"].insert_many(
+            [{"user_id": user_id, "compliance": value} for user_id, value in compliance]
+        )
+
+
+async def earned(db):
+    rows = await db["user_badges"].find({"earned": True}, {"_id": 0, "user_id": 1, "badge_id": 1}).to_list(None)
+    return sorted((row["user_id"], row["badge_id"]) for row in rows)
+
+
+def test_rules_are_indexed_by_metric_and_skip_unsupported_criteria():
+    rules = RuleIndex(BADGES)
+    assert set(rules.criteria) == {"solver", "diligent", "all-rounder"}
+    assert rules.by_metric == {
+        CHALLENGES_COMPLETED: {"solver", "all-rounder"},
+        MIN_COMPLIANCE: {"diligent", "all-rounder"},
+    }
+    values = {CHALLENGES_COMPLETED: {"u": 1}, MIN_COMPLIANCE: {"u": 85}}
+    assert rules.satisfied("all-rounder", values, "u")
+    assert not rules.satisfied("solver", values, "u")
+    assert not rules.satisfied("diligent", values, "u")
+    assert not rules.satisfied("all-rounder", values, "other")
+
+
+def test_only_badges_depending_on_the_changed_metric_are_evaluated(db, computed):
+    async def scenario():
+        await insert(db, passed=[("u", "c1"), ("u", "c2")], compliance=[("u", 95)])
+        awarded = await badges.on_metric_changed("u", CHALLENGES_COMPLETED)
+        return awarded, await earned(db)
+
+    awarded, rows = asyncio.run(scenario())
+    # "diligent" is satisfied too, but does not depend on challenges_completed
+    assert awarded == ["all-rounder", "solver"]
+    assert rows == [("u", "all-rounder"), ("u", "solver")]
+    # all-rounder needs min_compliance as well, so it is computed for this user only
+    assert sorted(computed) == [(CHALLENGES_COMPLETED, ["u"]), (MIN_COMPLIANCE, ["u"])]
+
+
+def test_metrics_of_unrelated_badges_are_not_computed(db, computed):
+    async def scenario():
+        await insert(db, compliance=[("u", 95)])
+        await db["badges"].delete_one({"id": "all-rounder"})
+        return await badges.on_metric_changed("u", MIN_COMPLIANCE)
+
+    assert asyncio.run(scenario()) == ["diligent"]
+    assert computed == [(MIN_COMPLIANCE, ["u"])]
+
+
+def test_already_earned_badges_are_skipped(db, computed):
+    async def scenario():
+        await insert(db, passed=[("u", "c1"), ("u", "c2")], compliance=[("u", 95)])
+        await db["user_badges"].insert_many([
+            {"user_id": "u", "badge_id": "solver", "earned": True},
+            {"user_id": "u", "badge_id": "all-rounder", "earned": True},
+        ])
+        return await badges.on_metric_changed("u", CHALLENGES_COMPLETED)
+
+    # Nothing left to earn, so no metric is computed at all
+    assert asyncio.run(scenario()) == []
+    assert computed == []
+
+
+def test_min_compliance_is_not_awarded_without_subjects(db, computed):
+    async def scenario():
+        await insert(db, users=["a", "b"], compliance=[("a", 95)])
+        return await badges.backfill(), await earned(db)
+
+    total, rows = asyncio.run(scenario())
+    assert (total, rows) == (1, [("a", "diligent")])
+
+
+def test_backfill_pages_through_users_in_batches(db, computed):
+    users = [f"user-{i}" for i in range(5)]
+
+    async def scenario():
+        await insert(db, users=users, passed=[(user_id, c) for user_id in users for c in ("c1", "c2")])
+        first = await badges.backfill(batch_size=2)
+        again = await badges.backfill(batch_size=2)
+        return first, again, await earned(db)
+
+    first, again, rows = asyncio.run(scenario())
+    assert first == 5 and again == 0
+    assert rows == [(user_id, "solver") for user_id in users]
+    batches = [user_ids for metric, user_ids in computed if metric == CHALLENGES_COMPLETED]
+    assert batches[:3] == [users[0:2], users[2:4], users[4:5]]
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from grading import STATUS_MIN_GRADE, classify, grade_components, grade_subjects, simulate_scenarios, solve_targets
+from models import Component, StatusEnum
+
+
+def component(name, scored, total, weight, pending=False):
+    return Component(name=name, scored=scored, total=total, weight=weight, pending=pending)
+
+
+QUIZ = component("Quiz", 18, 20, 50)
+MIDTERM = component("Midterm", 30, 40, 50)
+FINAL = component("Final", 0, 100, 100, pending=True)
+
+
+def test_weighted_grade_and_status():
+    assert grade_components([QUIZ, MIDTERM]) == (pytest.approx(82.5), StatusEnum.at_risk)
+
+
+def test_pending_components_do_not_count():
+    assert grade_components([QUIZ, MIDTERM, FINAL]) == (pytest.approx(82.5), StatusEnum.at_risk)
+    assert grade_components([FINAL]) == (0.0, StatusEnum.critical)
+
+
+def test_bulk_grading_matches_one_subject_at_a_time():
+    subjects = [[QUIZ, MIDTERM], [MIDTERM, FINAL], [], [component("Lab", 9, 10, 1).dict()]]
+    grades, statuses = grade_subjects(subjects)
+    assert [(float(g), s) for g, s in zip(grades, statuses)] == [grade_components(s) for s in subjects]
+
+
+def test_status_boundaries():
+    grades = np.array([74.99, 75, 84.99, 85, 89.99, 90, 100])
+    assert classify(grades) == [
+        StatusEnum.critical, StatusEnum.at_risk, StatusEnum.at_risk,
+        StatusEnum.on_track, StatusEnum.on_track, StatusEnum.excellent, StatusEnum.excellent,
+    ]
+
+
+def test_scenarios_score_pending_and_override_graded_components():
+    grades, statuses = simulate_scenarios([QUIZ, MIDTERM, FINAL], [
+        {},
+        {"Final": 100},
+        {"Final": 50, "Quiz": 20},
+        {"Unknown": 100},
+    ])
+    assert grades.tolist() == pytest.approx([82.5, 91.25, 68.75, 82.5])
+    assert statuses == [StatusEnum.at_risk, StatusEnum.excellent, StatusEnum.critical, StatusEnum.at_risk]
+
+
+def requirement(components, target):
+    _, results = solve_targets([components], [target])
+    return results[0][0]
+
+
+def test_single_pending_component_needs_the_whole_deficit():
+    components = [component("Quiz", 40, 50, 50), component("Final", 0, 100, 50, pending=True)]
+    on_track = requirement(components, StatusEnum.on_track)
+    assert (on_track.achievable, on_track.secured, on_track.required_percentage) == (True, False, 90.0)
+    assert [(c.name, c.min_score, c.floor_score) for c in on_track.components] == [("Final", 90.0, 90.0)]
+    assert requirement(components, StatusEnum.excellent).components[0].min_score == 100.0
+
+
+def test_even_split_and_floor_across_pending_components():
+    components = [
+        component("Quiz", 40, 50, 50),
+        component("Lab", 0, 100, 25, pending=True),
+        component("Final", 0, 100, 25, pending=True),
+    ]
+    on_track = requirement(components, StatusEnum.on_track)
+    assert on_track.required_percentage == 90.0
+    # 90 on both, or as little as 80 on one if the other gets full marks
+    assert [(c.min_score, c.floor_score) for c in on_track.components] == [(90.0, 80.0), (90.0, 80.0)]
+
+
+def test_unreachable_and_secured_targets():
+    hopeless = [component("Quiz", 0, 50, 50), component("Final", 0, 100, 50, pending=True)]
+    excellent = requirement(hopeless, StatusEnum.excellent)
+    assert (excellent.achievable, excellent.required_percentage) == (False, 180.0)
+
+    safe = [component("Quiz", 50, 50, 90), component("Final", 0, 100, 10, pending=True)]
+    excellent = requirement(safe, StatusEnum.excellent)
+    assert (excellent.achievable, excellent.secured, excellent.components[0].min_score) == (True, True, 0.0)
+
+    no_pending = requirement([component("Quiz", 40, 50, 50)], StatusEnum.excellent)
+    assert (no_pending.achievable, no_pending.required_percentage) == (False, None)
+
+
+def test_minimum_scores_reach_the_target():
+    rng = np.random.default_rng(7)
+    for _ in range(50):
+        components = [
+            component(f"C{i}", float(rng.integers(0, 21)), 20, float(rng.integers(1, 40)), pending=bool(rng.random() < 0.4))
+            for i in range(6)
+        ]
+        for target in (StatusEnum.excellent, StatusEnum.on_track, StatusEnum.at_risk):
+            needed = requirement(components, target)
+            if not needed.achievable or not needed.components:
+                continue
+            grades, _ = simulate_scenarios(components, [{c.name: c.min_score for c in needed.components}])
+            assert grades[0] >= STATUS_MIN_GRADE[target] - 1e-9
@@ -0,0 +1,24 @@
+import io
+
+import pytest
+from PIL import Image
+
+import image_pipeline
+
+
+def png(width: int, height: int) -> io.BytesIO:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_images_over_the_pixel_limit_are_refused(monkeypatch):
+    monkeypatch.setattr(image_pipeline, "MAX_IMAGE_PIXELS", 100 * 100)
+
+    # Just over the limit, well below the 2x where Pillow itself would raise
+    with pytest.raises(Image.DecompressionBombError):
+        image_pipeline.prepare_image(png(101, 100))
+
+    prepared = image_pipeline.prepare_image(png(100, 100))
+    assert (prepared.width, prepared.height) == (100, 100)
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import jobs
+from jobs import AnalysisJobQueue, QueueFull
+
+
+class SuspendingCollection:
+    """Yields to the event loop before every call, like Motor does"""
+
+    def __init__(self, collection, fail_inserts=False):
+        self._collection = collection
+        self.fail_inserts = fail_inserts
+
+    async def find_one(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        return await self._collection.find_one(*args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        await asyncio.sleep(0)
+        if self.fail_inserts:
+            raise RuntimeError("insert failed")
+        return await self._collection.insert_one(*args, **kwargs)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = AsyncMongoMockClient()["jobs"]["analysis_jobs"]
+    wrapped = SuspendingCollection(collection)
+    monkeypatch.setattr(jobs, "analysis_jobs_collection", wrapped)
+    return wrapped
+
+
+def queue(max_size: int) -> AnalysisJobQueue:
+    # No workers: jobs stay queued so the test controls the queue
+    job_queue = AnalysisJobQueue(workers=0, max_size=max_size)
+    job_queue.start()
+    return job_queue
+
+
+def test_concurrent_submits_of_one_image_share_a_job(collection):
+    async def scenario():
+        job_queue = queue(4)
+        ids = await asyncio.gather(*(job_queue.submit("same-sha", 0, "image") for _ in range(3)))
+        return ids, job_queue._queue.qsize(), await collection._collection.count_documents({})
+
+    ids, queued, documents = asyncio.run(scenario())
+    assert len(set(ids)) == 1
+    assert (queued, documents) == (1, 1)
+
+
+def test_full_queue_rejects_before_writing(collection):
+    async def scenario():
+        job_queue = queue(2)
+        results = await asyncio.gather(
+            *(job_queue.submit(f"sha-{i}", 0, "image") for i in range(3)), return_exceptions=True
+        )
+        return results, await collection._collection.count_documents({})
+
+    results, documents = asyncio.run(scenario())
+    assert sum(isinstance(result, QueueFull) for result in results) == 1
+    assert sum(isinstance(result, str) for result in results) == 2
+    assert documents == 2
+
+
+def test_failed_insert_releases_the_reservation(collection):
+    async def scenario():
+        job_queue = queue(1)
+        collection.fail_inserts = True
+        results = await asyncio.gather(*(job_queue.submit("sha", 0, "image") for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert (job_queue._in_flight, job_queue._reserved) == ({}, 0)
+
+        collection.fail_inserts = False
+        return await job_queue.submit("sha", 0, "image"), job_queue._queue.qsize()
+
+    job_id, queued = asyncio.run(scenario())
+    assert job_id and queued == 1
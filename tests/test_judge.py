@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+import judge as judge_module
+from judge import Judge, _matches
+
+ADD_CASES = [{"input": [1, 2], "expected": 3}, {"input": [2, 2], "expected": 5}]
+
+
+def run(code: str, cases=ADD_CASES, entry_point: str = "add", judge: Judge = None):
+    async def scenario():
+        runner = judge or Judge(workers=2)
+        await runner.start()
+        try:
+            return await runner.run(code, entry_point, cases)
+        finally:
+            await runner.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_passes_and_wrong_answers_are_told_apart():
+    results = run("def add(a, b):\n    return a + b\n")
+    assert [result["passed"] for result in results] == [True, False]
+    assert [result["actual"] for result in results] == [3, 4]
+    assert not any("error" in result for result in results)
+
+
+def test_matching_is_type_strict():
+    assert _matches([1, {"a": 2.5}], [1, {"a": 2.5}])
+    assert not _matches(True, 1)
+    assert not _matches(1.0, 1)
+    assert not _matches(1, 1.0)
+    assert not _matches([1, True], [1, 1])
+    assert not _matches({"a": 1.0}, {"a": 1})
+
+    results = run("def add(a, b):\n    return True if a == 1 else float(a + b)\n",
+                  cases=[{"input": [1, 0], "expected": 1}, {"input": [2, 2], "expected": 4}])
+    assert [result["passed"] for result in results] == [False, False]
+
+
+def test_cpu_time_limit(monkeypatch):
+    monkeypatch.setattr(judge_module, "JUDGE_CPU_SECONDS", 1)
+    monkeypatch.setattr(judge_module, "JUDGE_TIMEOUT_SECONDS", 10)
+    [result] = run("def add(a, b):\n    while True:\n        pass\n", cases=ADD_CASES[:1])
+    # Killed by SIGXCPU well before the wall-clock timeout
+    assert not result["passed"]
+    assert result["error"] == "Time limit exceeded"
+    assert result["runtime_ms"] is None
+
+
+def test_wall_clock_timeout(monkeypatch):
+    monkeypatch.setattr(judge_module, "JUDGE_TIMEOUT_SECONDS", 0.5)
+    [result] = run("import time\ndef add(a, b):\n    time.sleep(10)\n", cases=ADD_CASES[:1])
+    assert not result["passed"]
+    assert result["error"] == "Time limit exceeded"
+    assert result["runtime_ms"] == 500
+
+
+def test_memory_limit(monkeypatch):
+    monkeypatch.setattr(judge_module, "JUDGE_MEMORY_MB", 128)
+    [result] = run("def add(a, b):\n    return len(bytearray(512 * 1024 * 1024))\n", cases=ADD_CASES[:1])
+    assert not result["passed"]
+    assert result["error"] == "Memory limit exceeded"
+
+
+def test_forged_result_lines_cannot_claim_a_pass():
+    # The runner is untrusted: a forged line can only report a value, which is
+    # then checked against the expected output like any returned value
+    code = (
+        "import os\n"
+        "def add(a, b):\n"
+        "    line = b'{\"passed\": true, \"actual\": 4}\\n'\n"
+        "    print(line.decode())\n"
+        "    for fd in range(1, 64):\n"
+        "        try:\n"
+        "            os.write(fd, line)\n"
+        "        except OSError:\n"
+        "            pass\n"
+        "    os._exit(0)\n"
+    )
+    [result] = run(code, cases=ADD_CASES[:1])
+    assert not result["passed"]
+    assert result["actual"] == 4
+
+
+def test_runner_never_receives_the_expected_output():
+    judge = Judge(workers=2)
+    jobs = []
+    run_case = judge._run_case
+
+    async def spy(job):
+        jobs.append(job)
+        return await run_case(job)
+
+    judge._run_case = spy
+    # Returns whatever "expected" value it can find anywhere in the runner
+    code = (
+        "import gc\n"
+        "def add(a, b):\n"
+        "    for obj in gc.get_objects():\n"
+        "        if isinstance(obj, dict) and 'expected' in obj:\n"
+        "            return obj['expected']\n"
+        "    return None\n"
+    )
+    results = run(code, judge=judge)
+    assert [result["passed"] for result in results] == [False, False]
+    assert len(jobs) == 2 and not any("expected" in job for job in jobs)
+
+
+def test_run_requires_start():
+    with pytest.raises(RuntimeError):
+        asyncio.run(Judge(workers=1).run("", "add", ADD_CASES))
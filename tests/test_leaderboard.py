@@ -0,0 +1,69 @@
+import asyncio
+import random
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import leaderboard
+from leaderboard import Leaderboard, RankIndex, Row
+
+
+def brute_force_order(points):
+    return sorted(points, key=lambda user_id: (-points[user_id], user_id))
+
+
+def test_ranks_match_a_full_sort_under_random_updates():
+    rng = random.Random(25)
+    index, points = RankIndex(), {}
+    for _ in range(3000):
+        user_id = f"user-{rng.randrange(200):03d}"
+        points[user_id] = rng.randrange(50)
+        index.set_user(user_id, points[user_id], user_id, "")
+
+    order = brute_force_order(points)
+    assert [row[0] for row in index.rows()] == order
+    assert all(index.rank(user_id) == rank for rank, user_id in enumerate(order, 1))
+    assert [entry.user_id for entry in index.page(10, 5)] == order[10:15]
+    assert [entry.rank for entry in index.page(10, 5)] == [11, 12, 13, 14, 15]
+
+
+def test_neighbours_are_clipped_at_the_top_and_bottom():
+    index = RankIndex((f"u{i}", Row(100 - i, 0, f"U{i}", "")) for i in range(10))
+    assert [entry.user_id for entry in index.around("u5", 2)] == ["u3", "u4", "u5", "u6", "u7"]
+    assert [entry.user_id for entry in index.around("u0", 2)] == ["u0", "u1", "u2"]
+    assert [entry.user_id for entry in index.around("u9", 2)] == ["u7", "u8", "u9"]
+    assert index.around("nobody", 2) == [] and index.rank("nobody") is None
+
+
+def test_profile_and_solve_updates_keep_the_other_fields():
+    index = RankIndex([("a", Row(10, 3, "A", "a.png"))])
+    index.set_user("a", 20, "Alice", "alice.png")
+    index.add_solved("a")
+    index.add_solved("missing")
+    assert index.rows() == [["a", 20, 4, "Alice", "alice.png"]]
+    assert RankIndex((user_id, Row(*row)) for user_id, *row in index.rows()).rows() == index.rows()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = AsyncMongoMockClient()["leaderboard"]
+    monkeypatch.setattr(leaderboard, "users_collection", db["users"])
+    monkeypatch.setattr(leaderboard, "submissions_collection", db["submissions"])
+    return db
+
+
+def test_solve_events_replayed_after_a_build_are_not_counted_twice(db):
+    async def scenario():
+        await db["users"].insert_one({"id": "a", "name": "A", "avatar": "", "points": 5})
+        await db["submissions"].insert_many([
+            {"id": "s1", "user_id": "a", "status": "passed"},
+            {"id": "s2", "user_id": "a", "status": "failed"},
+        ])
+        board = Leaderboard()
+        board.index = await board.build()
+        event = {"ns": {"coll": "submissions"}, "fullDocument": {"user_id": "a"}}
+        await board._apply(event)
+        await board._apply(event)
+        return board.index.rows()
+
+    assert asyncio.run(scenario()) == [["a", 5, 1, "A", ""]]
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+import ai_services
+import llm_pool
+from emergentintegrations.llm.chat import UserMessage
+from fake_llm import FakeLlmChat, MENTOR_RESPONSE
+from llm_pool import LlmPool, LlmUnavailable
+
+
+class TrackingChat(FakeLlmChat):
+    """FakeLlmChat that remembers its sessions and the peak number of calls in flight"""
+
+    sessions = []
+    in_flight = 0
+    peak = 0
+
+    def __init__(self, session_id, system_message):
+        super().__init__(session_id, system_message)
+        TrackingChat.sessions.append(session_id)
+
+    async def send_message(self, message):
+        TrackingChat.in_flight += 1
+        TrackingChat.peak = max(TrackingChat.peak, TrackingChat.in_flight)
+        try:
+            return await super().send_message(message)
+        finally:
+            TrackingChat.in_flight -= 1
+
+
+@pytest.fixture(autouse=True)
+def fake_llm(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "20")
+    monkeypatch.setenv("FAKE_LLM_JITTER_MS", "0")
+    monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "0")
+    TrackingChat.sessions, TrackingChat.in_flight, TrackingChat.peak = [], 0, 0
+    llm_pool.set_chat_factory(TrackingChat)
+    yield
+    llm_pool.set_chat_factory(None)
+
+
+def pool(monkeypatch, **settings) -> LlmPool:
+    for name, value in settings.items():
+        monkeypatch.setenv(f"LLM_{name.upper()}", str(value))
+    return LlmPool("test", "system")
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    async def scenario():
+        test_pool = pool(monkeypatch, concurrency=2)
+        return await asyncio.gather(*(test_pool.send(UserMessage(text="hi")) for _ in range(6)))
+
+    assert asyncio.run(scenario()) == [MENTOR_RESPONSE] * 6
+    assert TrackingChat.peak == 2
+
+
+def test_every_call_gets_its_own_session(monkeypatch):
+    async def scenario():
+        test_pool = pool(monkeypatch)
+        await asyncio.gather(*(test_pool.send(UserMessage(text="hi")) for _ in range(4)))
+
+    asyncio.run(scenario())
+    assert len(set(TrackingChat.sessions)) == 4
+    assert all(session.startswith("test-") for session in TrackingChat.sessions)
+
+
+def test_full_queue_sheds_immediately(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "200")
+
+    async def scenario():
+        test_pool = pool(monkeypatch, concurrency=1, max_queue=1)
+        running = asyncio.create_task(test_pool.send(UserMessage(text="running")))
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(test_pool.send(UserMessage(text="waiting")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LlmUnavailable, match="queue full"):
+            await test_pool.send(UserMessage(text="shed"))
+        await asyncio.gather(running, waiting)
+
+    asyncio.run(scenario())
+    assert len(TrackingChat.sessions) == 2
+
+
+def test_queue_wait_times_out(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_LATENCY_MS", "300")
+
+    async def scenario():
+        test_pool = pool(monkeypatch, concurrency=1, queue_timeout=0.05)
+        running = asyncio.create_task(test_pool.send(UserMessage(text="running")))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LlmUnavailable, match="timed out"):
+            await test_pool.send(UserMessage(text="late"))
+        await running
+        return test_pool
+
+    test_pool = asyncio.run(scenario())
+    # Shedding is not a provider failure
+    assert test_pool.breaker.state == "closed"
+
+
+def test_breaker_opens_then_recovers_through_one_probe(monkeypatch):
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "2")
+    monkeypatch.setenv("LLM_BREAKER_RESET", "0.1")
+
+    async def scenario():
+        test_pool = pool(monkeypatch)
+        monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "1")
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await test_pool.send(UserMessage(text="fail"))
+        assert test_pool.breaker.state == "open"
+
+        with pytest.raises(LlmUnavailable, match="circuit open"):
+            await test_pool.send(UserMessage(text="shed"))
+        assert len(TrackingChat.sessions) == 2
+
+        await asyncio.sleep(0.1)
+        assert test_pool.breaker.state == "half-open"
+        monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "0")
+        assert await test_pool.send(UserMessage(text="probe")) == MENTOR_RESPONSE
+        assert test_pool.breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens_the_breaker(monkeypatch):
+    monkeypatch.setenv("LLM_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("LLM_BREAKER_RESET", "0.05")
+    monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "1")
+
+    async def scenario():
+        test_pool = pool(monkeypatch)
+        with pytest.raises(RuntimeError):
+            await test_pool.send(UserMessage(text="fail"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(RuntimeError):
+            await test_pool.send(UserMessage(text="probe"))
+        assert test_pool.breaker.state == "open"
+
+    asyncio.run(scenario())
+
+
+def test_ai_services_fall_back_when_the_provider_fails(monkeypatch):
+    monkeypatch.setenv("FAKE_LLM_FAILURE_RATE", "1")
+
+    async def scenario():
+        monkeypatch.setattr(ai_services, "mentor_pool", pool(monkeypatch))
+        monkeypatch.setattr(ai_services, "insights_pool", pool(monkeypatch))
+        feedback = await ai_services.generate_coding_mentor_feedback("def f(): pass", [])
+        insights = await ai_services.generate_tactical_insights([], [])
+        return feedback, insights
+
+    assert asyncio.run(scenario()) == (ai_services.MENTOR_FALLBACK, [])
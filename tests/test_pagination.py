@@ -0,0 +1,94 @@
+import asyncio
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from models import LegacyEntry, Subject
+from pagination import NEXT_CURSOR_HEADER, _keyset_filter, build_projection, render_page
+
+TIMELINE_ORDER = [("date", -1), ("id", -1)]
+CREATION_ORDER = [("created_at", 1), ("id", 1)]
+
+
+def timeline(count: int):
+    rng = random.Random(count)
+    start = datetime(2024, 1, 1)
+    # Few distinct dates, so most of the ordering comes from the id tie-break
+    return [
+        {"id": f"entry-{i:03d}", "user_id": "u", "semester": "S", "gpa": 3.0,
+         "date": start + timedelta(days=rng.randrange(4))}
+        for i in range(count)
+    ]
+
+
+def test_keyset_filter_on_id_alone():
+    assert _keyset_filter([("id", 1)], {"id": "b"}) == {"id": {"$gt": "b"}}
+
+
+def test_keyset_filter_pages_through_ties_exactly_once():
+    collection = mongomock.MongoClient().db.timeline
+    collection.insert_many(timeline(50))
+    expected = [doc["id"] for doc in collection.find().sort(TIMELINE_ORDER)]
+
+    seen, query = [], {}
+    while True:
+        page = list(collection.find(query).sort(TIMELINE_ORDER).limit(7))
+        if not page:
+            break
+        seen.extend(doc["id"] for doc in page)
+        query = _keyset_filter(TIMELINE_ORDER, page[-1])
+
+    assert seen == expected
+
+
+def test_render_page_follows_next_cursor():
+    async def scenario():
+        collection = AsyncMongoMockClient()["db"]["legacy_timeline"]
+        await collection.insert_many(timeline(25))
+        ids, after = [], None
+        while True:
+            body, headers = await render_page(collection, {"user_id": "u"}, LegacyEntry, after, 10, "gpa", TIMELINE_ORDER)
+            page = json.loads(body)
+            assert all(set(item) == {"id", "gpa"} for item in page)
+            ids.extend(item["id"] for item in page)
+            after = headers.get(NEXT_CURSOR_HEADER)
+            if after is None:
+                return ids, await collection.find({}, {"id": 1}).sort(TIMELINE_ORDER).to_list(None)
+
+    ids, ordered = asyncio.run(scenario())
+    assert ids == [doc["id"] for doc in ordered]
+
+
+def test_random_ids_page_in_creation_order():
+    async def scenario():
+        collection = AsyncMongoMockClient()["db"]["subjects"]
+        start = datetime(2024, 1, 1)
+        created = [
+            {"id": str(uuid.uuid4()), "user_id": "u", "name": f"S{i}", "created_at": start + timedelta(seconds=i // 3)}
+            for i in range(20)
+        ]
+        await collection.insert_many([dict(doc) for doc in created])
+        ids, after = [], None
+        while True:
+            body, headers = await render_page(collection, {"user_id": "u"}, Subject, after, 6, "name", CREATION_ORDER)
+            ids.extend(item["id"] for item in json.loads(body))
+            after = headers.get(NEXT_CURSOR_HEADER)
+            if after is None:
+                return created, ids
+
+    created, ids = asyncio.run(scenario())
+    # Ties on created_at fall back to the id, everything else follows creation
+    assert ids == [doc["id"] for doc in sorted(created, key=lambda doc: (doc["created_at"], doc["id"]))]
+
+
+def test_projection_rejects_unknown_fields():
+    with pytest.raises(HTTPException) as error:
+        build_projection("gpa,password", LegacyEntry)
+    assert error.value.status_code == 400
+    assert build_projection("gpa", LegacyEntry) == {"_id": 0, "id": 1, "gpa": 1}
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import seeding
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = AsyncMongoMockClient()["seeding"]
+    monkeypatch.setattr(seeding, "seed_state_collection", db["seed_state"])
+    return db
+
+
+def test_lease_is_exclusive_until_it_expires(db):
+    async def scenario():
+        assert await seeding._acquire("sample", "1", "worker-a")
+        assert not await seeding._acquire("sample", "1", "worker-b")
+        await db["seed_state"].update_one(
+            {"_id": "sample"}, {"$set": {"lock_expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        assert await seeding._acquire("sample", "1", "worker-b")
+        return await db["seed_state"].find_one({"_id": "sample"})
+
+    assert asyncio.run(scenario())["lock_owner"] == "worker-b"
+
+
+def test_lease_is_refused_for_a_version_already_seeded(db):
+    async def scenario():
+        await db["seed_state"].insert_one({"_id": "sample", "version": "1", "lock_expires_at": None})
+        return await seeding._acquire("sample", "1", "worker-a"), await seeding._acquire("sample", "2", "worker-a")
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_seed_runs_once_per_version(db):
+    runs = []
+
+    async def seed():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+
+    async def scenario():
+        concurrent = await asyncio.gather(*(seeding.seed_once("sample", "1", seed) for _ in range(3)))
+        again = await seeding.seed_once("sample", "1", seed)
+        upgraded = await seeding.seed_once("sample", "2", seed)
+        return concurrent, again, upgraded
+
+    concurrent, again, upgraded = asyncio.run(scenario())
+    assert sorted(concurrent) == [False, False, True]
+    assert (again, upgraded) == (False, True)
+    assert len(runs) == 2
+
+
+def test_failed_seed_releases_the_lease(db):
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        pass
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await seeding.seed_once("sample", "1", fail)
+        return await seeding.seed_once("sample", "1", succeed), await db["seed_state"].find_one({"_id": "sample"})
+
+    ran, state = asyncio.run(scenario())
+    assert ran and state["version"] == "1" and state["lock_owner"] is None
+
+
+def test_upserts_never_duplicate_or_overwrite(db):
+    async def scenario():
+        collection = db["challenges"]
+        first = await seeding.upsert_many(collection, [{"id": "a", "submissions": 0}, {"id": "b", "submissions": 0}])
+        await collection.update_one({"id": "a"}, {"$set": {"submissions": 7}})
+        second = await seeding.upsert_many(collection, [{"id": "a", "submissions": 0}, {"id": "c", "submissions": 0}])
+        return first, second, await collection.find({}, {"_id": 0}).sort("id").to_list(None)
+
+    first, second, docs = asyncio.run(scenario())
+    assert (first, second) == (2, 1)
+    assert docs == [{"id": "a", "submissions": 7}, {"id": "b", "submissions": 0}, {"id": "c", "submissions": 0}]
+
+
+def test_upserts_overwrite_only_the_listed_fields(db):
+    async def scenario():
+        collection = db["challenges"]
+        await seeding.upsert_many(collection, [{"id": "a", "title": "Old", "submissions": 0}], fields=("title",))
+        await collection.update_one({"id": "a"}, {"$set": {"submissions": 7}})
+        inserted = await seeding.upsert_many(
+            collection, [{"id": "a", "title": "New", "submissions": 0}, {"id": "b", "title": "B", "submissions": 0}],
+            fields=("title",)
+        )
+        return inserted, await collection.find({}, {"_id": 0}).sort("id").to_list(None)
+
+    inserted, docs = asyncio.run(scenario())
+    assert inserted == 1
+    assert docs == [{"id": "a", "title": "New", "submissions": 7}, {"id": "b", "title": "B", "submissions": 0}]
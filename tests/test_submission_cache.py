@@ -0,0 +1,46 @@
+from submission_cache import cache_key, normalize_code
+
+SOLUTION = """def two_sum(nums, target):
+    seen = {}
+    for i, n in enumerate(nums):
+        if target - n in seen:
+            return [seen[target - n], i]
+        seen[n] = i
+"""
+
+REFORMATTED = """# my solution
+def two_sum(nums, target):   # O(n)
+
+  seen = {}
+  for i, n in enumerate(nums):
+      if target - n in seen:   
+          return [seen[target - n], i]
+
+  seen[n] = i
+"""
+
+TESTS = {"entry_point": "two_sum", "cases": [{"input": [[3, 3], 6], "expected": [0, 1]}]}
+
+
+def test_comments_blank_lines_and_indent_width_are_ignored():
+    assert normalize_code(SOLUTION.replace("    ", "\t")) == normalize_code(SOLUTION)
+    assert normalize_code("# header\n\n" + SOLUTION + "\n\n# trailer\n") == normalize_code(SOLUTION)
+
+
+def test_block_structure_and_strings_still_count():
+    # REFORMATTED dedents the last line out of the loop: a different program
+    assert normalize_code(REFORMATTED) != normalize_code(SOLUTION)
+    assert normalize_code('x = "# not a comment"') != normalize_code("x = ''")
+
+
+def test_code_that_does_not_tokenize_only_matches_itself():
+    broken = "def f(:\n    return (1,\n"
+    assert normalize_code(broken + "   \n") == normalize_code(broken)
+    assert normalize_code(broken) != normalize_code(broken.replace("1", "2"))
+
+
+def test_key_covers_challenge_and_test_suite():
+    key = cache_key("challenge-001", TESTS, SOLUTION)
+    assert cache_key("challenge-001", TESTS, "# hi\n" + SOLUTION) == key
+    assert cache_key("challenge-002", TESTS, SOLUTION) != key
+    assert cache_key("challenge-001", {**TESTS, "cases": []}, SOLUTION) != key